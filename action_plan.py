@@ -0,0 +1,373 @@
+from change_plan import PlanningEditor
+from condition_expression import compile_expression
+from property_store import EXPRESSION, PropertyStore, check_condition
+from vector_conditions import can_vectorize, run_vectorized
+from xml_document import XmlNode
+
+# Actions that change one child of the root at a time and can share a single pass
+FUSABLE_ACTIONS = ("add_node_type", "remove_node_by_condition", "modify_node_type")
+
+
+# Levels below an item that are searched for a condition on a plain child name
+# (1 = the item's own children). Deeper nodes need a path such as images/image/url,
+# or a "depth" in the action
+CONDITION_DEPTH = 2
+
+
+def field_nodes(editor, item, child, depth=CONDITION_DEPTH):
+    """
+    Nodes below item that a condition on child looks at. A path like
+    images/image/url is followed tag by tag and every node at its end counts.
+    A plain name is searched one level at a time, at most depth levels down,
+    and only the first level that has nodes with that name counts: a <type>
+    inside scraped facilities never hides or stands in for the property's
+    own <type>, and images are only visited when nothing above matches.
+    """
+    if "/" in child:
+        nodes = [item]
+        for tag in child.split("/"):
+            nodes = [node for parent in nodes for node in editor.node_children(parent) if node.tag == tag]
+        return nodes
+
+    level = [item]
+    for _ in range(depth):
+        level = [node for parent in level for node in editor.node_children(parent)]
+        found = [node for node in level if node.tag == child]
+        if found or not level:
+            return found
+    return []
+
+
+def field_matches(editor, item, child, condition, value, depth=CONDITION_DEPTH):
+    # True if one of the field nodes of item satisfies the condition
+    return any(check_condition(condition, value, editor.node_text(node))
+               for node in field_nodes(editor, item, child, depth))
+
+
+def item_matcher(editor, expression):
+    # matches(item) for an expression action, paths are looked up through the editor
+    def matches(item):
+        def lookup(path):
+            node = editor.find_path(item, path)
+            return editor.node_text(node) if node is not None else None
+        return expression.matches(lookup)
+    return matches
+
+
+def element_children(element):
+    # (tag, text, element) of the child nodes an lxml element becomes, see node_from_element:
+    # attributes first, as nodes named "<tag><attribute>" (element None), then child elements
+    tag = element.tag
+    for attr_name, attr_value in element.attrib.items():
+        yield f"{tag}{attr_name}", attr_value, None
+    for child in element:
+        if isinstance(child.tag, str):  # Skip comments and processing instructions
+            yield child.tag, child.text.strip() if child.text else "", child
+
+
+def element_text(element, path):
+    # Text of the node that the lxml element at path becomes (first match on every level), None if there is none
+    text = None
+    for tag in path.split("/"):
+        if element is None:
+            return None
+        for child_tag, text, child in element_children(element):
+            if child_tag == tag:
+                element = child
+                break
+        else:
+            return None
+    return text
+
+
+def element_field_texts(element, child, depth=CONDITION_DEPTH):
+    # field_nodes() for an lxml element, the texts of the nodes it finds
+    if "/" in child:
+        entries = [(None, None, element)]
+        for tag in child.split("/"):
+            entries = [entry for _, _, parent in entries if parent is not None
+                       for entry in element_children(parent) if entry[0] == tag]
+        return [text for _, text, _ in entries]
+
+    level = [(None, None, element)]
+    for _ in range(depth):
+        level = [entry for _, _, parent in level if parent is not None for entry in element_children(parent)]
+        found = [text for tag, text, _ in level if tag == child]
+        if found or not level:
+            return found
+    return []
+
+
+def split_pushdown(actions):
+    """Split off the leading removal actions, they can be applied while the feed is parsed."""
+    count = 0
+    for action in actions:
+        if action["action"] != "remove_node_by_condition":
+            break
+        count += 1
+    return list(actions[:count]), list(actions[count:])
+
+
+def element_filter(removal_actions):
+    """
+    keep(element) for the top-level lxml elements of a feed that is being parsed:
+    False if one of the removal actions would remove the item it becomes.
+    """
+    steps = [compile_element_step(action) for action in removal_actions]
+
+    def keep(element):
+        tag = element.tag
+        for parent_tag, step in steps:
+            if tag == parent_tag and step(element):
+                return False
+        return True
+
+    return keep
+
+
+def compile_element_step(action):
+    # Same matching as the remove steps of ActionPlan, on an lxml element instead of a node
+    child = action["child"]
+    value = action["value"]
+    condition = action["condition"]
+
+    if condition == EXPRESSION:
+        expression = compile_expression(value)
+
+        def step(element):
+            return expression.matches(lambda path: element_text(element, path))
+    elif action["parent"] == "property" and child in PropertyStore.FIELDS:
+        def step(element):
+            field = element.find(child)
+            if field is None:
+                return False
+            return check_condition(condition, value, field.text.strip() if field.text else "")
+    else:
+        depth = action.get("depth", CONDITION_DEPTH)
+
+        def step(element):
+            return any(check_condition(condition, value, text) for text in element_field_texts(element, child, depth))
+
+    return action["parent"], step
+
+
+class ActionPlan:
+    """
+    Compiles a group action list into stages. Consecutive add/remove/modify
+    actions form one fused stage that visits every child of the root once and
+    runs all of their steps on it in list order; other actions run on their own
+    as before. The result is the same as running the actions one after another,
+    because each of these actions only looks at the item it changes.
+    """
+
+    def __init__(self, actions):
+        self.actions = list(actions)
+        self.stages = []  # ("fused", [actions]) or ("single", action)
+        for action in self.actions:
+            if action["action"] in FUSABLE_ACTIONS:
+                if self.stages and self.stages[-1][0] == "fused":
+                    self.stages[-1][1].append(action)
+                else:
+                    self.stages.append(("fused", [action]))
+            else:
+                self.stages.append(("single", action))
+
+    def passes(self):
+        return len(self.stages)
+
+    def passes_saved(self):
+        return len(self.actions) - len(self.stages)
+
+    def can_plan(self):
+        # Fused stages only change the document through an editor; other actions
+        # are methods of the tree and need the GUI
+        return all(kind == "fused" for kind, _ in self.stages)
+
+    def summary(self):
+        return (f"{len(self.actions)} actions in {self.passes()} passes over the document "
+                f"({self.passes_saved()} passes saved)")
+
+    def run(self, editor, progress):
+        """
+        Run the plan. editor is the tree (or anything with the same append_node,
+        set_node_text, remove_nodes, find_child, find_path, node_text and
+        node_children methods and a document); actions that can't be fused are
+        called on it by name, like Worker did before. progress is a
+        ProgressTracker with one stage per pass.
+        """
+        for kind, stage in self.stages:
+            if kind == "fused":
+                root = editor.document.root
+                progress.start_stage(self.stage_name(stage), len(root.children) if root is not None else 0)
+                self.run_fused(editor, stage, progress.set_percent)
+            else:
+                progress.start_stage(stage["action"])
+                getattr(editor, stage["action"])(progress.set_percent, stage)
+        progress.finish()
+
+    def run_planned(self, document, progress, apply_changes, run_single):
+        """
+        Run the plan without changing the document on this thread, for workers.
+        Every fused stage runs on a PlanningEditor and its ChangePlan is passed
+        to apply_changes(changes); other actions are passed to
+        run_single(action, progress_callback). Both have to change the document
+        on its own thread and return when they are done, the next stage reads
+        the document as they left it.
+        """
+        for kind, stage in self.stages:
+            if kind == "fused":
+                root = document.root
+                progress.start_stage(self.stage_name(stage), len(root.children) if root is not None else 0)
+                editor = PlanningEditor(document)
+                self.run_fused(editor, stage, progress.set_percent)
+                apply_changes(editor.freeze())
+            else:
+                progress.start_stage(stage["action"])
+                run_single(stage, progress.set_percent)
+        progress.finish()
+
+    @staticmethod
+    def stage_name(actions):
+        if len(actions) == 1:
+            return actions[0]["action"]
+        return f"{len(actions)} group actions"
+
+    def run_fused(self, editor, actions, progress_callback):
+        root = editor.document.root
+        if root is None:
+            return
+        if can_vectorize(actions):
+            # Conditions on property fields are evaluated as NumPy masks over the store columns
+            run_vectorized(editor, actions, progress_callback)
+            return
+
+        steps = []
+        written = set()  # Children changed by the earlier actions of the stage
+        for action in actions:
+            steps.append(self.compile_step(editor, action, written))
+            if action["action"] != "remove_node_by_condition":
+                written.add(action["child"])
+
+        items = list(root.children)
+        total = len(items) or 1
+        removed = []
+        for i, item in enumerate(items):
+            tag = item.tag
+            for parent_tag, step in steps:
+                if tag == parent_tag and step(item):
+                    # The item was removed, later actions don't see it
+                    removed.append(item)
+                    break
+            if i % 256 == 0:
+                progress_callback(int((i + 1) / total * 100))
+
+        editor.remove_nodes(removed)
+        progress_callback(100)
+
+    @staticmethod
+    def compile_step(editor, action, written=()):
+        # A step changes one item and returns True if the item has to be removed.
+        # written holds the children that earlier actions of the stage change
+        name = action["action"]
+        child = action["child"]
+        value = action["value"]
+        condition = action["condition"]
+        # Known property fields are found by path (e.g. desc/en), like the column store does
+        known_field = action["parent"] == "property" and child in PropertyStore.FIELDS
+
+        if condition == EXPRESSION:
+            # The expression is compiled once and decides for the whole item
+            matches = item_matcher(editor, compile_expression(value))
+
+            if name == "add_node_type":
+                # The value holds the expression, the new node gets the new value
+                new_value = action["new_value"]
+
+                def step(item):
+                    if matches(item):
+                        editor.append_node(item, child, new_value)
+                    return False
+
+            elif name == "modify_node_type":
+                new_value = action["new_value"]
+
+                def step(item):
+                    node = editor.find_path(item, child)
+                    if node is not None and matches(item):
+                        editor.set_node_text(node, new_value)
+                    return False
+
+            else:
+                step = matches
+
+        elif name == "add_node_type":
+            def step(item):
+                editor.append_node(item, child, value)
+                return False
+
+        elif name == "modify_node_type":
+            new_value = action["new_value"]
+
+            def step(item):
+                node = editor.find_path(item, child)
+                if node is not None and check_condition(condition, value, editor.node_text(node)):
+                    editor.set_node_text(node, new_value)
+                return False
+
+        elif known_field and child not in written and editor.document.store.indexed(child, condition):
+            # Nothing before it changes the field, so the store's index still answers the
+            # condition; the matching properties are looked up once for the whole pass
+            store = editor.document.store
+            matched = {store.node(row) for row in store.match(child, condition, value)}
+
+            def step(item):
+                return item in matched
+
+        elif known_field:
+            # remove_node_by_condition on a known property field
+            def step(item):
+                node = editor.find_path(item, child)
+                return node is not None and check_condition(condition, value, editor.node_text(node))
+
+        else:
+            # remove_node_by_condition on any other child or path
+            depth = action.get("depth", CONDITION_DEPTH)
+
+            def step(item):
+                return field_matches(editor, item, child, condition, value, depth)
+
+        return action["parent"], step
+
+
+class DocumentEditor:
+    """
+    Editor for ActionPlan that changes the document directly, for runs
+    without the GUI (see cli.py). Same methods as the tree, without a view.
+    """
+
+    def __init__(self, document):
+        self.document = document
+
+    def append_node(self, parent_node, tag, text=""):
+        return self.document.insert_node(parent_node, XmlNode(tag, text or ""))
+
+    def set_node_text(self, node, text):
+        self.document.set_text(node, text)
+
+    def remove_nodes(self, nodes):
+        self.document.remove_nodes(nodes)
+
+    def restore_nodes(self, entries):
+        self.document.restore_nodes(entries)
+
+    def find_child(self, node, tag):
+        return node.find_child(tag)
+
+    def find_path(self, node, path):
+        return node.find_path(path)
+
+    def node_text(self, node):
+        return node.text
+
+    def node_children(self, node):
+        return node.children
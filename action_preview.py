@@ -0,0 +1,25 @@
+from action_plan import FUSABLE_ACTIONS
+from vector_conditions import available, preview_vectorized
+
+
+def preview_actions(document, actions):
+    """
+    Dry run of an action list. Returns (hits, survivors): hits[i] is the number
+    of properties action i would add to, modify or remove (None for actions
+    that are not group actions) and survivors the number of properties left.
+    The document is not changed.
+
+    The counts come from NumPy masks over the store, see preview_vectorized.
+    Raises ValueError for lists that can't be counted ahead.
+    """
+    group_actions = [action for action in actions if action["action"] in FUSABLE_ACTIONS]
+    if document.root is None:
+        counts, survivors = [0] * len(group_actions), 0
+    elif not available():
+        raise ValueError("NumPy is not installed")
+    else:
+        counts, survivors = preview_vectorized(document.store, group_actions)
+
+    counts = iter(counts)
+    hits = [next(counts) if action["action"] in FUSABLE_ACTIONS else None for action in actions]
+    return hits, survivors
@@ -1,10 +1,19 @@
 import sys
-from PySide6.QtWidgets import QApplication
-
-from main_window import MainWindow
+from multiprocessing import freeze_support
 
 if __name__ == "__main__":
+    # Needed by the process pool in the frozen (PyInstaller) build
+    freeze_support()
+    if len(sys.argv) > 1 and sys.argv[1] in ("run", "batch"):
+        # Headless run of an action file, Qt is never imported
+        from cli import main
+        sys.exit(main(sys.argv[1:]))
+
+    from PySide6.QtWidgets import QApplication
+
+    from main_window import MainWindow
+
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    sys.exit(app.exec())
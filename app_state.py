@@ -1,25 +1,24 @@
 from PySide6.QtCore import Signal, QObject
-from PySide6.QtWidgets import QTreeWidget
+from PySide6.QtWidgets import QTreeView
 
 
 class AppState(QObject):
     # Signals
     property_count_updated = Signal(int)
-    current_property_node = None
 
     def __init__(self):
         super().__init__()
-        self.__tree_widget = None     # Will hold the reference to QTreeWidget
+        self.__tree_widget = None     # Will hold the reference to the tree view
         self.__property_count = 0     # Property nodes count
         self.__is_processing = False  # Processing status
         self.path_to_app = ''
         self.icons_path = ''
         self.opened_file = ''
 
-    def set_tree_widget(self, tree_widget: QTreeWidget):
+    def set_tree_widget(self, tree_widget: QTreeView):
         self.__tree_widget = tree_widget
 
-    def get_tree_widget(self) -> QTreeWidget:
+    def get_tree_widget(self) -> QTreeView:
         return self.__tree_widget
 
     def set_property_count(self, count: int):
@@ -0,0 +1,147 @@
+from xml_document import XmlNode
+
+
+class ChangePlan:
+    """
+    Changes computed by group actions, in terms of the nodes of the document:
+    value edits, inserted nodes and removed nodes. Built by
+    PlanningEditor.freeze() and applied in one go on the GUI thread.
+    """
+    __slots__ = ('edits', 'inserts', 'removals')
+
+    def __init__(self, edits=(), inserts=(), removals=()):
+        self.edits = tuple(edits)  # (node, new text)
+        # (parent, tag, text); parent is a node of the document, or the index of
+        # an earlier insert when the node is added below a node that is new too
+        self.inserts = tuple(inserts)
+        self.removals = tuple(removals)
+
+    def __len__(self):
+        return len(self.edits) + len(self.inserts) + len(self.removals)
+
+    def summary(self):
+        return f"{len(self.edits)} edits, {len(self.inserts)} new nodes, {len(self.removals)} removed nodes"
+
+    def apply(self, editor):
+        # editor has the same append_node, set_node_text and remove_nodes methods as the tree
+        for node, text in self.edits:
+            editor.set_node_text(node, text)
+        new_nodes = []
+        for parent, tag, text in self.inserts:
+            if isinstance(parent, int):
+                parent = new_nodes[parent]
+            new_nodes.append(editor.append_node(parent, tag, text))
+        editor.remove_nodes(self.removals)
+
+
+class PlanningEditor:
+    """
+    Editor for ActionPlan that never changes the document. Edits, new nodes
+    and removals are kept next to it and every read made through the editor
+    sees them, so the actions behave as if they ran on the document itself.
+    The document must not change until freeze() is called.
+    """
+
+    def __init__(self, document):
+        self.document = document
+        self._texts = {}  # node of the document -> new text
+        self._added = {}  # node of the document -> new child nodes, in insert order
+        self._removed = {}  # node of the document -> None
+        self._new = set()  # new nodes, they are not in the document and are changed directly
+
+    # READING
+
+    def node_children(self, node):
+        children = node.children
+        if node not in self._new:
+            if self._removed:
+                children = [child for child in children if child not in self._removed]
+            added = self._added.get(node)
+            if added:
+                children = children + added
+        return children
+
+    def find_child(self, node, tag):
+        if node in self._new:
+            return node.find_child(tag)
+        child = node.find_child(tag)
+        if child is not None and child not in self._removed:
+            return child
+        # New nodes come after the existing ones, so they only match when nothing else does
+        for child in self.node_children(node):
+            if child.tag == tag:
+                return child
+        return None
+
+    def find_path(self, node, path):
+        for tag in path.split("/"):
+            node = self.find_child(node, tag)
+            if node is None:
+                return None
+        return node
+
+    def node_text(self, node):
+        return self._texts.get(node, node.text)
+
+    # CHANGES
+
+    def append_node(self, parent_node, tag, text=""):
+        node = XmlNode(tag, text or "")
+        self._new.add(node)
+        if parent_node in self._new:
+            parent_node.append(node)
+        else:
+            self._added.setdefault(parent_node, []).append(node)
+        return node
+
+    def set_node_text(self, node, text):
+        if node in self._new:
+            node.text = text
+        else:
+            self._texts[node] = text
+
+    def remove_nodes(self, nodes):
+        for node in nodes:
+            if node in self._new:
+                self._remove_new(node)
+            else:
+                self._removed[node] = None
+
+    def _remove_new(self, node):
+        self._new.discard(node)
+        parent = node.parent
+        if parent is not None:
+            parent.remove(node)
+            return
+        for added in self._added.values():
+            if node in added:
+                added.remove(node)
+                return
+
+    def freeze(self):
+        """ChangePlan of everything that was done through the editor."""
+        edits = [(node, text) for node, text in self._texts.items() if not self._is_removed(node)]
+
+        inserts = []
+        for parent, added in self._added.items():
+            if self._is_removed(parent):
+                continue
+            for node in added:
+                # Nodes added below new nodes follow their parent
+                stack = [(parent, node)]
+                while stack:
+                    parent_ref, new_node = stack.pop()
+                    inserts.append((parent_ref, new_node.tag, new_node.text))
+                    index = len(inserts) - 1
+                    stack.extend((index, child) for child in reversed(new_node.children))
+
+        # Nodes inside a subtree that is removed too go with it
+        removals = [node for node in self._removed if not self._is_removed(node.parent)]
+        return ChangePlan(edits, inserts, removals)
+
+    def _is_removed(self, node):
+        while node is not None:
+            if node in self._removed:
+                return True
+            node = node.parent
+        return False
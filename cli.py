@@ -0,0 +1,322 @@
+"""
+Headless runner for action files, without Qt:
+
+    lextrus-xml-edit run feed.xml --actions CONFIG/action_all.json --normalize-prices --out result.xml
+    lextrus-xml-edit batch day1.xml day2.xml --actions CONFIG/action_all.json --normalize-prices --out-dir out
+
+(python cli.py ... or app.py ...). Actions, price normalization and saving
+work the same way as in the GUI; batch runs every feed in its own process.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from configparser import ConfigParser
+
+from lxml import etree
+
+from action_plan import ActionPlan, DocumentEditor, element_filter, split_pushdown
+from description_cleaner import DescriptionCleaner
+from feed_snapshot import file_digest, load_snapshot
+from json_stream import NdjsonReader, write_json, write_ndjson
+from progress import FRAME_RATE, ProgressTracker
+from property_store import price_updates
+from xml_document import XmlDocument, node_from_element
+from xml_stream import FeedReader
+from xml_writer import write_xml
+
+SETTINGS_FILE = "settings.ini"
+
+
+def load_actions(actions_file):
+    # One JSON action per line, the format TabGroupActions saves
+    with open(actions_file, 'r', encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def load_document(feed_file, removal_actions=(), progress=None):
+    """
+    Read an XML or NDJSON feed into a new XmlDocument. removal_actions are
+    applied while an XML feed is parsed, like "Open XML with Action List".
+    progress(percent) is called with the part of the file that has been read.
+    Returns the document and the number of properties that were skipped.
+    """
+    document = XmlDocument()
+    if feed_file.lower().endswith(".ndjson"):
+        reader = NdjsonReader(feed_file)
+        add_item = lambda node, root: root.append(node)
+    elif removal_actions:
+        reader = FeedReader(feed_file, keep=element_filter(removal_actions))
+        add_item = node_from_element
+    else:
+        # A snapshot written by the GUI for the same file content skips parsing
+        try:
+            root = load_snapshot(feed_file, file_digest(feed_file))
+        except (OSError, ValueError, UnicodeDecodeError, IndexError):
+            root = None
+        if root is not None:
+            document.set_root_node(root)
+            return document, 0
+        reader = FeedReader(feed_file)
+        add_item = node_from_element
+
+    root = None
+    for batch in reader.batches():
+        if root is None:
+            root = document.set_root(reader.root_tag, reader.root_attrib)
+        for item in batch:
+            add_item(item, root)
+        if progress:
+            progress(reader.progress)
+    if root is None:
+        root = document.set_root(reader.root_tag, reader.root_attrib)
+    root.text = reader.root_text
+    document.reindex()
+    return document, getattr(reader, "skipped", 0)
+
+
+def save_document(document, out_file, cleaner):
+    # Same formats as "Save File As...": descriptions are cleaned for XML only
+    extension = os.path.splitext(out_file)[1].lower()
+    if extension == ".ndjson":
+        write_ndjson(document.root, out_file)
+    elif extension == ".json":
+        write_json(document.root, out_file)
+    else:
+        editor = DocumentEditor(document)
+        for desc_node, text in cleaner.document_updates(document.store):
+            editor.set_node_text(desc_node, text)
+        write_xml(document.root, out_file)
+
+
+def description_cleaner(rules_file):
+    if rules_file is None and os.path.exists(SETTINGS_FILE):
+        config = ConfigParser()
+        config.read(SETTINGS_FILE)
+        rules_file = config.get('Settings', 'DESCRIPTION_RULES', fallback=None)
+    if rules_file:
+        return DescriptionCleaner.from_file(rules_file)
+    return DescriptionCleaner()
+
+
+def print_progress(percent, message):
+    # Progress only goes to a terminal, logs of cron jobs get the summary lines
+    if sys.stderr.isatty():
+        sys.stderr.write(f"\r{percent:3d}% {message}\033[K")
+        sys.stderr.flush()
+
+
+def process_feed(feed_file, out_file, actions, normalize_prices, cleaner, report=None, log=print):
+    """
+    Load one feed, run the actions, normalize prices, clean descriptions and
+    save it, like the GUI does. report(fraction, text) gets the progress of the
+    whole feed, log() the summary lines. Returns counts and the seconds spent
+    in every step.
+    """
+    report = report or (lambda fraction, text: None)
+    plan_actions = actions
+    pushdown = []
+    if not feed_file.lower().endswith(".ndjson"):
+        pushdown, plan_actions = split_pushdown(actions)
+    plan = ActionPlan(plan_actions)
+    if not plan.can_plan():
+        raise ValueError("Only group actions (add/remove/modify node type) can run without the GUI")
+
+    # Loading and saving count as much as all action passes together
+    times = {}
+    started = time.perf_counter()
+    document, skipped = load_document(feed_file, pushdown, lambda percent: report(percent / 300, "Loading"))
+    if document.is_empty():
+        raise ValueError(f"No XML root found in {feed_file}")
+    loaded = len(document.store) + skipped
+    times["load"] = time.perf_counter() - started
+    log(f"Loaded {loaded} properties in {times['load']:.2f}s"
+        + (f", {skipped} removed while parsing" if skipped else ""))
+
+    editor = DocumentEditor(document)
+    step_started = time.perf_counter()
+    if plan.actions:
+        log(plan.summary())
+        tracker = ProgressTracker(lambda percent, text: report((100 + percent) / 300, text), plan.passes())
+        plan.run(editor, tracker)
+    times["actions"] = time.perf_counter() - step_started
+
+    step_started = time.perf_counter()
+    normalized = 0
+    if normalize_prices:
+        report(2 / 3, "Normalizing prices")
+        updates = list(price_updates(document.store))
+        for price_node, price in updates:
+            editor.set_node_text(price_node, price)
+        normalized = len(updates)
+        log(f"Normalized {normalized} prices")
+    times["prices"] = time.perf_counter() - step_started
+
+    step_started = time.perf_counter()
+    report(2 / 3, "Saving")
+    save_document(document, out_file, cleaner)
+    times["save"] = time.perf_counter() - step_started
+    times["total"] = time.perf_counter() - started
+    report(1.0, "Saved")
+    log(f"Saved {len(document.store)} properties to {out_file} in {times['total']:.2f}s")
+    return {"loaded": loaded, "skipped": skipped, "normalized": normalized, "saved": len(document.store),
+            "times": times}
+
+
+def run(args):
+    actions = load_actions(args.actions) if args.actions else []
+    cleaner = description_cleaner(args.rules)
+    report = lambda fraction, text: print_progress(int(fraction * 100), text)
+    process_feed(args.feed, args.out, actions, args.normalize_prices, cleaner, report,
+                 log=lambda line: print(("\r\033[K" if sys.stderr.isatty() else "") + line))
+    if sys.stderr.isatty():
+        sys.stderr.write("\n")
+
+
+def batch(args):
+    """
+    Run the same pipeline on several feeds, one feed per worker process. Every
+    feed is saved under its own name in args.out_dir. Returns the number of
+    feeds that failed.
+    """
+    out_dir = os.path.abspath(args.out_dir)
+    for feed_file in args.feeds:
+        if os.path.dirname(os.path.abspath(feed_file)) == out_dir:
+            raise ValueError(f"{feed_file} would be overwritten, choose another --out-dir")
+    names = [os.path.basename(feed_file) for feed_file in args.feeds]
+    if len(set(names)) < len(names):
+        raise ValueError("Feeds with the same file name would be saved over each other")
+    os.makedirs(out_dir, exist_ok=True)
+
+    actions = load_actions(args.actions) if args.actions else []
+    if not ActionPlan(actions).can_plan():
+        raise ValueError("Only group actions (add/remove/modify node type) can run without the GUI")
+    cleaner = description_cleaner(args.rules)
+    jobs = max(1, min(args.jobs or os.cpu_count() or 1, len(args.feeds)))
+    print(f"{len(args.feeds)} feeds, {jobs} processes")
+
+    started = time.perf_counter()
+    tracker = ProgressTracker(print_progress)
+    tracker.start_stage("Feeds", len(args.feeds))
+    fractions = [0.0] * len(args.feeds)
+    failed = 0
+    work_time = 0.0
+    # Workers get the description memo of the last run and send back the part
+    # their feed used, the memo is saved once for all feeds
+    base_memo = cleaner.load_memo()
+    memo = dict(base_memo)
+    progress_queue = multiprocessing.Queue()
+    with ProcessPoolExecutor(jobs, initializer=_init_batch_worker,
+                             initargs=(actions, args.normalize_prices, cleaner.rules, cleaner.strip_leading,
+                                       base_memo, progress_queue)) as executor:
+        futures = {executor.submit(_process_batch_feed, index, feed_file, os.path.join(out_dir, name)): index
+                   for index, (feed_file, name) in enumerate(zip(args.feeds, names))}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=1 / FRAME_RATE, return_when=FIRST_COMPLETED)
+            while not progress_queue.empty():
+                index, fraction = progress_queue.get()
+                fractions[index] = max(fractions[index], fraction)
+            for future in done:
+                index = futures[future]
+                fractions[index] = 1.0
+                feed_file = args.feeds[index]
+                if sys.stderr.isatty():
+                    sys.stderr.write("\r\033[K")
+                try:
+                    result, feed_memo = future.result()
+                except Exception as e:
+                    # Whatever went wrong with one feed, the others are still saved and reported
+                    failed += 1
+                    print(f"{feed_file}: Error: {type(e).__name__}: {e}")
+                    continue
+                memo.update(feed_memo)
+                times = result["times"]
+                work_time += times["total"]
+                print(f"{feed_file}: {result['loaded']} -> {result['saved']} properties, "
+                      f"{result['normalized']} prices normalized · "
+                      + " · ".join(f"{step} {times[step]:.2f}s" for step in ("load", "actions", "prices", "save", "total")))
+            tracker.set_done(sum(fractions))
+    tracker.finish()
+    if sys.stderr.isatty():
+        sys.stderr.write("\n")
+
+    cleaner.memo = memo
+    cleaner.save_memo()
+    wall_time = time.perf_counter() - started
+    print(f"{len(args.feeds) - failed} of {len(args.feeds)} feeds saved to {out_dir} in {wall_time:.2f}s "
+          f"({work_time:.2f}s of work, {work_time / wall_time if wall_time else 0:.1f}x)")
+    return failed
+
+
+# Batch worker processes get the settings once and keep them for every feed
+_batch_settings = None
+
+
+def _init_batch_worker(actions, normalize_prices, rules, strip_leading, memo, progress_queue):
+    global _batch_settings
+    cleaner = DescriptionCleaner(rules, strip_leading, memo_file=None)
+    # The feeds are already spread over all cores, a pool per feed would only compete with them
+    cleaner.use_pool = False
+    _batch_settings = (actions, normalize_prices, cleaner, memo, progress_queue)
+
+
+def _process_batch_feed(index, feed_file, out_file):
+    actions, normalize_prices, cleaner, memo, progress_queue = _batch_settings
+    last_fraction = -1.0
+
+    def report(fraction, text):
+        nonlocal last_fraction
+        # Whole percents are enough, the queue is shared by all workers
+        if fraction - last_fraction >= 0.01:
+            last_fraction = fraction
+            progress_queue.put((index, fraction))
+
+    cleaner.memo = memo
+    cleaner.used = set()
+    try:
+        result = process_feed(feed_file, out_file, actions, normalize_prices, cleaner, report, log=lambda line: None)
+    except etree.LxmlError as e:
+        # lxml errors can't be sent back to the main process
+        raise ValueError(str(e)) from None
+    return result, {key: cleaner.memo[key] for key in cleaner.used}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="lextrus-xml-edit", description="Edit Lextrus XML feeds without the GUI.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="apply an action file to a feed and save the result")
+    run_parser.add_argument("feed", help="XML or NDJSON feed")
+    run_parser.add_argument("--actions", help="action file saved by the Group actions tab (one JSON action per line)")
+    run_parser.add_argument("--normalize-prices", action="store_true", help="round prices up to whole thousands")
+    run_parser.add_argument("--rules", help="description rules file (default: DESCRIPTION_RULES from settings.ini)")
+    run_parser.add_argument("--out", required=True, help="output file, .xml, .json or .ndjson")
+
+    batch_parser = commands.add_parser("batch", help="apply an action file to several feeds in parallel")
+    batch_parser.add_argument("feeds", nargs="+", help="XML or NDJSON feeds")
+    batch_parser.add_argument("--actions", help="action file saved by the Group actions tab (one JSON action per line)")
+    batch_parser.add_argument("--normalize-prices", action="store_true", help="round prices up to whole thousands")
+    batch_parser.add_argument("--rules", help="description rules file (default: DESCRIPTION_RULES from settings.ini)")
+    batch_parser.add_argument("--out-dir", required=True, help="directory the feeds are saved to, under their own names")
+    batch_parser.add_argument("--jobs", type=int, help="worker processes (default: one per CPU core)")
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "batch":
+            return 1 if batch(args) else 0
+        run(args)
+    except (OSError, ValueError, etree.LxmlError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    # Needed by the description cleaning process pool in frozen builds
+    from multiprocessing import freeze_support
+    freeze_support()
+    sys.exit(main())
@@ -0,0 +1,259 @@
+import re
+from functools import lru_cache
+
+from property_store import to_number
+
+# Tokens of the expression language, see compile_expression()
+TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<number>-?\d+(?:\.\d+)?(?![\w/]))
+      | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<symbol>==|!=|<=|>=|<|>|~|\(|\)|\[|\]|,)
+      | (?P<name>[A-Za-z_][\w.:-]*(?:/[A-Za-z_][\w.:-]*)*)
+    )""", re.VERBOSE)
+KEYWORDS = ("and", "or", "not", "in", "contains")
+COMPARISONS = ("==", "!=", "<", "<=", ">", ">=", "~", "in", "not in", "contains")
+NUMERIC_COMPARISONS = ("<", "<=", ">", ">=")
+
+
+class Expression:
+    """
+    A compiled condition on a whole item (usually a <property>). tree is the
+    parsed expression, made of tuples:
+
+        ("and", [expressions]), ("or", [expressions]), ("not", expression),
+        ("exists", path), ("compare", path, operator, value)
+
+    value is a str or float, a compiled regex for "~" and a (strings, numbers)
+    pair of sets for "in". fields holds every path the expression reads.
+    """
+    __slots__ = ('text', 'tree', 'fields', '_predicate')
+
+    def __init__(self, text, tree):
+        self.text = text
+        self.tree = tree
+        self.fields = frozenset(expression_fields(tree))
+        self._predicate = compile_tree(tree)
+
+    def matches(self, lookup):
+        """lookup(path) returns the text of the node at path, or None if there is no such node."""
+        return self._predicate(lookup)
+
+
+@lru_cache(maxsize=256)
+def compile_expression(text):
+    """
+    Compile a condition like
+
+        type in ["villa", "apartment"] and price >= 100000 and not desc/en ~ "(?i)sea view"
+
+    Operators: and, or, not and parentheses; ==, != and contains on texts;
+    <, <=, >, >= on numbers (== and != compare numbers when the value is a
+    number); ~ is a regex search; in / not in take a list of strings and
+    numbers. A path on its own is true when the node exists. Paths are
+    relative to the item, e.g. desc/en. Strings are raw, only \\" (or \\')
+    is an escape, so regexes can be written as they are.
+
+    A comparison on a node that does not exist is false. Raises ValueError
+    for an invalid expression.
+    """
+    parser = ExpressionParser(text)
+    tree = parser.parse_or()
+    if parser.peek() is not None:
+        parser.fail(f"unexpected {parser.peek()[1]!r}")
+    return Expression(text, tree)
+
+
+class ExpressionParser:
+    # Recursive descent over the tokens, one method per precedence level
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.position = 0
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            self.fail("unexpected end")
+        self.position += 1
+        return token
+
+    def accept(self, kind, value=None):
+        token = self.peek()
+        if token is not None and token[0] == kind and (value is None or token[1] == value):
+            self.position += 1
+            return token
+        return None
+
+    def expect(self, kind, value):
+        if not self.accept(kind, value):
+            token = self.peek()
+            self.fail(f"expected {value!r}" + (f", got {token[1]!r}" if token else ""))
+
+    def fail(self, message):
+        raise ValueError(f"Invalid expression {self.text!r}: {message}")
+
+    def parse_or(self):
+        operands = [self.parse_and()]
+        while self.accept("keyword", "or"):
+            operands.append(self.parse_and())
+        return operands[0] if len(operands) == 1 else ("or", operands)
+
+    def parse_and(self):
+        operands = [self.parse_not()]
+        while self.accept("keyword", "and"):
+            operands.append(self.parse_not())
+        return operands[0] if len(operands) == 1 else ("and", operands)
+
+    def parse_not(self):
+        if self.accept("keyword", "not"):
+            return ("not", self.parse_not())
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        if self.accept("symbol", "("):
+            tree = self.parse_or()
+            self.expect("symbol", ")")
+            return tree
+
+        kind, path = self.next()
+        if kind != "name":
+            self.fail(f"expected a node path, got {path!r}")
+
+        token = self.peek()
+        if token is None or token[0] not in ("symbol", "keyword") or token[1] not in COMPARISONS + ("not",):
+            return ("exists", path)
+        if token == ("keyword", "not"):
+            if self.peek(1) != ("keyword", "in"):
+                return ("exists", path)
+            self.position += 2
+            operator = "not in"
+        else:
+            self.position += 1
+            operator = token[1]
+
+        if operator in ("in", "not in"):
+            return ("compare", path, operator, self.parse_list())
+
+        kind, value = self.next()
+        if kind not in ("string", "number"):
+            self.fail(f"expected a value after {operator!r}, got {value!r}")
+        if operator in NUMERIC_COMPARISONS and kind != "number":
+            self.fail(f"{operator!r} needs a number, got {value!r}")
+        if operator == "~":
+            try:
+                value = re.compile(str(value))
+            except re.error as e:
+                self.fail(f"bad regex {value!r}: {e}")
+        elif operator == "contains":
+            value = str(value)
+        return ("compare", path, operator, value)
+
+    def parse_list(self):
+        self.expect("symbol", "[")
+        strings, numbers = set(), set()
+        while not self.accept("symbol", "]"):
+            kind, value = self.next()
+            if kind == "string":
+                strings.add(value)
+            elif kind == "number":
+                numbers.add(value)
+            else:
+                self.fail(f"expected a string or a number in the list, got {value!r}")
+            if not self.accept("symbol", ","):
+                self.expect("symbol", "]")
+                break
+        return frozenset(strings), frozenset(numbers)
+
+
+def tokenize(text):
+    # [(kind, value)]; strings are unquoted and numbers converted to float
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if match is None or match.end() == position:
+            raise ValueError(f"Invalid expression {text!r}: unexpected {text[position:].strip()[:10]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "number":
+            value = float(value)
+        elif kind == "string":
+            quote = value[0]
+            value = value[1:-1].replace("\\" + quote, quote)
+        elif value in KEYWORDS:
+            kind = "keyword"
+        tokens.append((kind, value))
+    return tokens
+
+
+def expression_fields(tree):
+    match tree:
+        case ("exists", path) | ("compare", path, _, _):
+            yield path
+        case ("not", operand):
+            yield from expression_fields(operand)
+        case (_, operands):
+            for operand in operands:
+                yield from expression_fields(operand)
+
+
+def compile_tree(tree):
+    # Turns the tree into nested closures once, so items are matched without looking at the tree again
+    match tree:
+        case ("and", operands):
+            predicates = [compile_tree(operand) for operand in operands]
+            return lambda lookup: all(predicate(lookup) for predicate in predicates)
+        case ("or", operands):
+            predicates = [compile_tree(operand) for operand in operands]
+            return lambda lookup: any(predicate(lookup) for predicate in predicates)
+        case ("not", operand):
+            predicate = compile_tree(operand)
+            return lambda lookup: not predicate(lookup)
+        case ("exists", path):
+            return lambda lookup: lookup(path) is not None
+        case ("compare", path, operator, value):
+            test = compile_comparison(operator, value)
+
+            def compare(lookup):
+                text = lookup(path)
+                return text is not None and test(text)
+            return compare
+
+
+def compile_comparison(operator, value):
+    # test(text) for a node that exists
+    numeric = isinstance(value, float)
+    match operator:
+        case "==":
+            return (lambda text: to_number(text) == value) if numeric else (lambda text: text == value)
+        case "!=":
+            return (lambda text: to_number(text) != value) if numeric else (lambda text: text != value)
+        case "<":
+            return lambda text: to_number(text) < value
+        case "<=":
+            return lambda text: to_number(text) <= value
+        case ">":
+            return lambda text: to_number(text) > value
+        case ">=":
+            return lambda text: to_number(text) >= value
+        case "~":
+            return lambda text: value.search(text) is not None
+        case "contains":
+            return lambda text: value in text
+        case "in" | "not in":
+            strings, numbers = value
+            if numbers:
+                found = lambda text: text in strings or to_number(text) in numbers
+            else:
+                found = lambda text: text in strings
+            if operator == "in":
+                return found
+            return lambda text: not found(text)
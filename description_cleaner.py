@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# (pattern, replacement) pairs, applied in this order to the first line of a description
+DEFAULT_RULES = [
+    (r"\? | \?|&quot;|Property ID: |Ref: |\?", ""),
+    # remove all text after (id)
+    (r"(\(\d+\)).*", r"\1"),
+    # remove starting " – €" and ending "+VAT"
+    (r" – €.*?\+VAT", ""),
+    (r"\s+", " "),
+]
+DEFAULT_STRIP_LEADING = "\uFE0F \u200B"
+
+MEMO_FILE = os.path.join("CACHE", "description_memo.json")
+# Remembered descriptions that were not seen for this long are dropped, and
+# the least recently seen ones when there are more than MEMO_MAX_ITEMS
+MEMO_MAX_AGE_DAYS = 30
+MEMO_MAX_ITEMS = 500000
+MEMO_FORMAT = 2  # Entries are [cleaned text or None, last used (Unix time)]
+
+# Below this number of new descriptions starting worker processes costs more than it saves
+POOL_MIN_ITEMS = 5000
+POOL_BATCH_SIZE = 1000
+
+
+class DescriptionCleaner:
+    """
+    Cleans the first line of property descriptions with a rule set that is
+    compiled once. Results are remembered by the hash of the description and
+    kept on disk, so descriptions that did not change since the last run are
+    not cleaned again. Results that were not used for MEMO_MAX_AGE_DAYS are
+    dropped when the memo is saved.
+    """
+
+    def __init__(self, rules=None, strip_leading=DEFAULT_STRIP_LEADING, memo_file=MEMO_FILE):
+        self.rules = [tuple(rule) for rule in (rules or DEFAULT_RULES)]
+        self.strip_leading = strip_leading
+        self.memo_file = memo_file
+        self.compiled = [(re.compile(pattern), replacement) for pattern, replacement in self.rules]
+        # Old results are not valid any more when the rules change
+        self.fingerprint = hashlib.sha1(json.dumps([MEMO_FORMAT, self.rules, strip_leading]).encode("utf-8")).hexdigest()
+        # description hash -> [cleaned text or None when cleaning changes nothing, last used]
+        self.memo = None
+        self.used = set()  # Hashes looked up or added since used was last reset
+        self.use_pool = True  # Clean large sets of new descriptions in worker processes
+
+    @classmethod
+    def from_file(cls, rules_file, memo_file=MEMO_FILE):
+        # {"rules": [[pattern, replacement], ...], "strip_leading": "..."}
+        with open(rules_file, 'r', encoding='utf-8') as file:
+            config = json.load(file)
+        return cls(config.get("rules"), config.get("strip_leading", DEFAULT_STRIP_LEADING), memo_file)
+
+    def clean_text(self, text):
+        for pattern, replacement in self.compiled:
+            text = pattern.sub(replacement, text)
+        return text.lstrip(self.strip_leading)
+
+    def clean(self, description):
+        lines = description.splitlines()
+        if lines:
+            lines[0] = self.clean_text(lines[0])
+        return "\n".join(lines)
+
+    def clean_all(self, descriptions):
+        """Return the cleaned version of every description, in the same order."""
+        if self.memo is None:
+            self.memo = self.load_memo()
+
+        now = int(time.time())
+        keys = [description_hash(description) for description in descriptions]
+        missing = {}
+        for key, description in zip(keys, descriptions):
+            entry = self.memo.get(key)
+            if entry is None:
+                missing[key] = description
+            else:
+                entry[1] = now
+
+        if missing:
+            cleaned = self.clean_batches(list(missing.values()))
+            for (key, description), text in zip(missing.items(), cleaned):
+                self.memo[key] = [None if text == description else text, now]
+
+        results = []
+        for key, description in zip(keys, descriptions):
+            text = self.memo[key][0]
+            results.append(description if text is None else text)
+
+        self.used.update(keys)
+        self.save_memo()
+        return results
+
+    def document_updates(self, store):
+        """(desc/en node, cleaned text) for every property description that changes."""
+        descriptions = store.column('desc/en')
+        rows = [row for row in store.rows() if descriptions[row] is not None]
+
+        original_texts = [descriptions[row] for row in rows]
+        updated_texts = self.clean_all(original_texts)
+
+        return [(store.field_node(row, 'desc/en'), updated_text)
+                for row, original_text, updated_text in zip(rows, original_texts, updated_texts)
+                if updated_text != original_text]
+
+    def clean_batches(self, descriptions):
+        if not self.use_pool or len(descriptions) < POOL_MIN_ITEMS:
+            return [self.clean(description) for description in descriptions]
+
+        batches = [descriptions[i:i + POOL_BATCH_SIZE] for i in range(0, len(descriptions), POOL_BATCH_SIZE)]
+        with ProcessPoolExecutor(initializer=_init_worker, initargs=(self.rules, self.strip_leading)) as executor:
+            results = []
+            for batch in executor.map(_clean_batch, batches):
+                results.extend(batch)
+        return results
+
+    def load_memo(self):
+        if self.memo_file is None:
+            return {}
+        try:
+            with open(self.memo_file, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if data.get("fingerprint") != self.fingerprint:
+            return {}
+        return data.get("items", {})
+
+    def prune_memo(self):
+        # Old results go first, then the least recently used ones above MEMO_MAX_ITEMS
+        cutoff = time.time() - MEMO_MAX_AGE_DAYS * 24 * 3600
+        self.memo = {key: entry for key, entry in self.memo.items() if entry[1] >= cutoff}
+        if len(self.memo) > MEMO_MAX_ITEMS:
+            recent = sorted(self.memo.items(), key=lambda item: item[1][1], reverse=True)[:MEMO_MAX_ITEMS]
+            self.memo = dict(recent)
+
+    def save_memo(self):
+        if self.memo_file is None:
+            return
+        self.prune_memo()
+        try:
+            os.makedirs(os.path.dirname(self.memo_file) or ".", exist_ok=True)
+            temp_file = f"{self.memo_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as file:
+                json.dump({"fingerprint": self.fingerprint, "items": self.memo}, file)
+            os.replace(temp_file, self.memo_file)
+        except OSError as e:
+            # The memo is only a cache, descriptions are cleaned again next time
+            print(f"Description memo was not saved: {e}")
+
+
+def description_hash(description):
+    return hashlib.blake2b(description.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# Worker processes compile the rules once and reuse them for every batch
+_worker_cleaner = None
+
+
+def _init_worker(rules, strip_leading):
+    global _worker_cleaner
+    _worker_cleaner = DescriptionCleaner(rules, strip_leading, memo_file=None)
+
+
+def _clean_batch(descriptions):
+    return [_worker_cleaner.clean(description) for description in descriptions]
@@ -0,0 +1,165 @@
+from contextlib import contextmanager
+
+# Undo steps that are kept, older ones are dropped
+UNDO_LIMIT = 50
+
+
+class JournalStep:
+    """One undoable user operation and the inverse data of the changes it made."""
+    __slots__ = ('name', 'operations')
+
+    def __init__(self, name):
+        self.name = name
+        # ("text", node, old text, new text)
+        # ("insert", parent, row, node)
+        # ("remove", [(parent, row, node), ...]) - the removed subtrees themselves
+        # ("restore", [(parent, row, node), ...])
+        self.operations = []
+
+    def size(self):
+        return sum(len(operation[1]) if operation[0] in ("remove", "restore") else 1 for operation in self.operations)
+
+
+class EditJournal:
+    """
+    Undo/redo stack of document changes. XmlDocument records every change it
+    makes as an inverse operation: old texts and references to removed
+    subtrees, never a copy of the document, so a step costs memory in
+    proportion to what it changed. Changes made inside step() form one undo
+    step, any other change is a step of its own.
+    """
+
+    def __init__(self, limit=UNDO_LIMIT):
+        self.limit = limit
+        self.undo_steps = []
+        self.redo_steps = []
+        self._step = None  # Step that is being recorded
+        self._depth = 0
+        self._paused = False  # Set while a step is undone or redone
+
+    def clear(self):
+        self.undo_steps = []
+        self.redo_steps = []
+
+    @contextmanager
+    def step(self, name):
+        if self._depth == 0:
+            self._step = JournalStep(name)
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                step, self._step = self._step, None
+                self._push(step)
+
+    def _push(self, step):
+        if not step.operations:
+            return
+        self.undo_steps.append(step)
+        del self.undo_steps[:-self.limit]
+        self.redo_steps = []
+
+    def _record(self, operation, name):
+        if self._paused:
+            return
+        if self._step is not None:
+            self._step.operations.append(operation)
+        else:
+            step = JournalStep(name)
+            step.operations.append(operation)
+            self._push(step)
+
+    # RECORDING, called by XmlDocument
+
+    def record_text(self, node, old_text, new_text):
+        if old_text != new_text:
+            self._record(("text", node, old_text, new_text), "Edit value")
+
+    def record_insert(self, parent, row, node):
+        self._record(("insert", parent, row, node), "Add node")
+
+    def record_remove(self, entries):
+        if entries:
+            self._record(("remove", entries), "Remove nodes")
+
+    def record_restore(self, entries):
+        if entries:
+            self._record(("restore", entries), "Restore nodes")
+
+    # UNDO / REDO
+
+    def can_undo(self):
+        return bool(self.undo_steps)
+
+    def can_redo(self):
+        return bool(self.redo_steps)
+
+    def undo_name(self):
+        return self.undo_steps[-1].name if self.undo_steps else ""
+
+    def redo_name(self):
+        return self.redo_steps[-1].name if self.redo_steps else ""
+
+    def next_undo_size(self):
+        return self.undo_steps[-1].size() if self.undo_steps else 0
+
+    def next_redo_size(self):
+        return self.redo_steps[-1].size() if self.redo_steps else 0
+
+    def undo(self, editor):
+        """
+        Revert the last step through editor (the tree, or anything with
+        set_node_text, remove_nodes and restore_nodes).
+        Returns the name of the step.
+        """
+        step = self.undo_steps.pop()
+        self._paused = True
+        try:
+            for operation in merge_inserts(reversed(step.operations)):
+                match operation:
+                    case ("text", node, old_text, _):
+                        editor.set_node_text(node, old_text)
+                    case ("remove", entries):
+                        editor.restore_nodes(entries)
+                    case ("restore", entries):
+                        editor.remove_nodes([node for _, _, node in entries])
+        finally:
+            self._paused = False
+        self.redo_steps.append(step)
+        return step.name
+
+    def redo(self, editor):
+        step = self.redo_steps.pop()
+        self._paused = True
+        try:
+            for operation in merge_inserts(step.operations):
+                match operation:
+                    case ("text", node, _, new_text):
+                        editor.set_node_text(node, new_text)
+                    case ("remove", entries):
+                        editor.remove_nodes([node for _, _, node in entries])
+                    case ("restore", entries):
+                        editor.restore_nodes(entries)
+        finally:
+            self._paused = False
+        self.undo_steps.append(step)
+        return step.name
+
+
+def merge_inserts(operations):
+    # Runs of inserts (e.g. add_node_type on every property) are replayed as one
+    # "restore" of all their nodes, so they are added or removed in one go
+    entries = []
+    for operation in operations:
+        if operation[0] == "insert":
+            _, parent, row, node = operation
+            entries.append((parent, row, node))
+            continue
+        if entries:
+            yield ("restore", entries)
+            entries = []
+        yield operation
+    if entries:
+        yield ("restore", entries)
@@ -0,0 +1,162 @@
+import gc
+import hashlib
+import mmap
+import os
+import struct
+import time
+from array import array
+
+from xml_document import XmlNode
+
+# Bump when the way XML is turned into nodes changes, old snapshots are then ignored
+PARSER_VERSION = 1
+
+SNAPSHOT_DIR = ".snapshots"
+SNAPSHOT_MAX_AGE_DAYS = 14
+SNAPSHOT_MAX_SIZE_MB = 512
+
+_MAGIC = b"LXSNAP\x00\x01"
+# magic, parser version, node count, sha256 of the XML file, string table offset and length
+_HEADER = struct.Struct("=8sII32sQQ")
+# (tag, text, child count) of a node, uint32 each
+_RECORD_SIZE = 3 * array('I').itemsize
+
+
+def file_digest(xml_file):
+    with open(xml_file, 'rb') as file:
+        return hashlib.file_digest(file, "sha256").digest()
+
+
+def snapshot_path(xml_file, digest):
+    folder = os.path.join(os.path.dirname(os.path.abspath(xml_file)), SNAPSHOT_DIR)
+    return os.path.join(folder, f"{digest.hex()}-v{PARSER_VERSION}.snap")
+
+
+def save_snapshot(root, xml_file, digest=None):
+    """
+    Write the parsed document next to the XML file. Layout: header, one
+    (tag, text, child count) triple of uint32 per node in document order, then
+    all distinct strings joined with NUL characters.
+    """
+    temp_path, path = write_snapshot(root, xml_file, digest)
+    os.replace(temp_path, path)
+    return path
+
+
+def write_snapshot(root, xml_file, digest=None):
+    """
+    First half of save_snapshot: write the snapshot to a temporary file and
+    return (temporary path, snapshot path). It only counts once the file is
+    moved in place with os.replace(), e.g. after checking on another thread
+    that the document did not change while it was written.
+    """
+    digest = digest or file_digest(xml_file)
+    path = snapshot_path(xml_file, digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    string_ids = {}
+    nodes = array('I')
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        tag_id = string_ids.setdefault(node.tag, len(string_ids))
+        text_id = string_ids.setdefault(node.text, len(string_ids))
+        nodes.extend((tag_id, text_id, len(node.children)))
+        stack.extend(reversed(node.children))
+
+    strings = "\x00".join(string_ids).encode("utf-8")
+    strings_offset = _HEADER.size + len(nodes) * nodes.itemsize
+    header = _HEADER.pack(_MAGIC, PARSER_VERSION, len(nodes) // 3, digest, strings_offset, len(strings))
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as file:
+        file.write(header)
+        nodes.tofile(file)
+        file.write(strings)
+    return temp_path, path
+
+
+def load_snapshot(xml_file, digest=None):
+    """Return the root XmlNode stored for this exact file content, or None."""
+    digest = digest or file_digest(xml_file)
+    path = snapshot_path(xml_file, digest)
+    if not os.path.exists(path):
+        return None
+
+    # The file is mapped, the node records are read in place instead of being copied
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if len(data) < _HEADER.size:
+            return None
+        magic, version, node_count, stored_digest, strings_offset, strings_length = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != PARSER_VERSION or stored_digest != digest:
+            return None
+        # A truncated or damaged file is ignored, the feed is then parsed again
+        if strings_offset != _HEADER.size + node_count * _RECORD_SIZE \
+                or len(data) != strings_offset + strings_length:
+            return None
+        if node_count == 0:
+            return None
+
+        strings = data[strings_offset:].decode("utf-8").split("\x00")
+        with memoryview(data) as view, view[_HEADER.size:strings_offset].cast("I") as records:
+            root = _build_nodes(records, strings)
+
+    # Touch the file so eviction treats it as recently used
+    os.utime(path)
+    return root
+
+
+def _build_nodes(records, strings):
+    # Millions of new nodes would start the cycle collector over and over, while
+    # none of them can be garbage yet; it is paused until the tree is built
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        values = iter(records)
+        root = XmlNode(strings[next(values)], strings[next(values)])
+        # The node that gets the next children, its child list and how many it still expects
+        parent, siblings, remaining = root, root.children, next(values)
+        stack = []
+        for tag_id, text_id, child_count in zip(values, values, values):
+            while not remaining:
+                parent, siblings, remaining = stack.pop()
+            node = XmlNode(strings[tag_id], strings[text_id], parent)
+            node._row = len(siblings)
+            siblings.append(node)
+            remaining -= 1
+            if child_count:
+                stack.append((parent, siblings, remaining))
+                parent, siblings, remaining = node, node.children, child_count
+    finally:
+        if collecting:
+            gc.enable()
+
+    if remaining or any(entry[2] for entry in stack):
+        raise ValueError("Snapshot node records don't form a complete tree")
+    return root
+
+
+def evict_snapshots(folder, max_age_days=SNAPSHOT_MAX_AGE_DAYS, max_size_mb=SNAPSHOT_MAX_SIZE_MB):
+    """Remove snapshots older than max_age_days, then the least recently used ones above max_size_mb."""
+    if not os.path.isdir(folder):
+        return
+
+    now = time.time()
+    entries = []
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if not name.endswith(".snap") or not os.path.isfile(path):
+            continue
+        stat = os.stat(path)
+        if now - stat.st_mtime > max_age_days * 86400:
+            os.remove(path)
+        else:
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total_size = sum(size for _, size, _ in entries)
+    max_size = max_size_mb * 1024 * 1024
+    for _, size, path in sorted(entries):
+        if total_size <= max_size:
+            break
+        os.remove(path)
+        total_size -= size
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+HTTP_CACHE_DIR = os.path.join("CACHE", "http")
+HTTP_CACHE_MAX_SIZE_MB = 256
+
+
+class CachedResponse:
+    """A page kept on disk with the validators the server sent for it."""
+    __slots__ = ('url', 'etag', 'last_modified', 'encoding', 'body')
+
+    def __init__(self, url, etag, last_modified, encoding, body):
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.encoding = encoding
+        self.body = body
+
+    @property
+    def text(self):
+        return self.body.decode(self.encoding or "utf-8", errors="replace")
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """
+    Response bodies kept on disk, one file per URL, with their ETag and
+    Last-Modified. A cached page is asked for with a conditional request and
+    read from disk when the server answers 304 Not Modified. Pages without
+    validators are not kept, they can't be revalidated. Every use touches the
+    file, evict() removes the least recently used ones above max_size_mb.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, folder=HTTP_CACHE_DIR, max_size_mb=HTTP_CACHE_MAX_SIZE_MB):
+        self.folder = folder
+        self.max_size_mb = max_size_mb
+        self.hits = 0  # Pages served from disk after a 304
+        self.downloads = 0  # Pages downloaded (new, changed or without validators)
+        self._lock = threading.Lock()
+
+    def path(self, url):
+        return os.path.join(self.folder, hashlib.sha256(url.encode("utf-8")).hexdigest()[:32] + ".http")
+
+    def load(self, url):
+        # File layout: one JSON line of metadata, then the body as it was received
+        try:
+            with open(self.path(url), 'rb') as file:
+                meta = json.loads(file.readline())
+                body = file.read()
+        except (OSError, ValueError):
+            return None
+        if meta.get("url") != url:
+            return None
+        return CachedResponse(url, meta.get("etag"), meta.get("last_modified"), meta.get("encoding"), body)
+
+    def store(self, url, response):
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        self.count("downloads")
+        if not etag and not last_modified:
+            return
+        meta = {"url": url, "etag": etag, "last_modified": last_modified,
+                "encoding": response.encoding or response.apparent_encoding}
+        path = self.path(url)
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as file:
+                file.write(json.dumps(meta).encode("utf-8") + b"\n")
+                file.write(response.content)
+            os.replace(temp_path, path)
+        except OSError as e:
+            # The cache is only an optimization, the page is downloaded again next time
+            print(f"Response for {url} was not cached: {e}")
+
+    def hit(self, cached):
+        self.count("hits")
+        try:
+            # Touch the file so eviction treats it as recently used
+            os.utime(self.path(cached.url))
+        except OSError:
+            pass
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def evict(self):
+        """Remove the least recently used responses until the cache fits in max_size_mb."""
+        if not os.path.isdir(self.folder):
+            return
+        entries = []
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if name.endswith(".tmp") and time.time() - stat.st_mtime > 3600:
+                # Left behind by a run that was killed while writing
+                os.remove(path)
+            elif name.endswith(".http"):
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total_size = sum(size for _, size, _ in entries)
+        max_size = self.max_size_mb * 1024 * 1024
+        for _, size, path in sorted(entries):
+            if total_size <= max_size:
+                break
+            os.remove(path)
+            total_size -= size
+
+    def summary(self):
+        total = self.hits + self.downloads
+        return f"{self.hits} of {total} pages were not modified and read from the cache"
@@ -0,0 +1,122 @@
+import json
+import os
+import sys
+
+from xml_document import XmlNode
+
+# Size of the buffer in front of the output file
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def dict_from_node(node):
+    """{"tag", "text", "children"} dict of a node and its subtree, the same shape the JSON export always had."""
+    result = {"tag": node.tag, "text": node.text, "children": []}
+    stack = [(node, result)]
+    while stack:
+        parent_node, parent_dict = stack.pop()
+        for child in parent_node.children:
+            child_dict = {"tag": child.tag, "text": child.text, "children": []}
+            parent_dict["children"].append(child_dict)
+            if child.children:
+                stack.append((child, child_dict))
+    return result
+
+
+def node_from_dict(data, parent=None):
+    node = XmlNode(sys.intern(data["tag"]), data.get("text") or "")
+    if parent is not None:
+        parent.append(node)
+    stack = [(node, data.get("children", ()))]
+    while stack:
+        parent_node, children = stack.pop()
+        for child_data in children:
+            child = parent_node.append(XmlNode(sys.intern(child_data["tag"]), child_data.get("text") or ""))
+            if child_data.get("children"):
+                stack.append((child, child_data["children"]))
+    return node
+
+
+def write_json(root, file_name, compact=False):
+    """
+    Write the document as one JSON value, one child of the root at a time. The
+    default output is the same as json.dump(..., indent=4) of the whole tree,
+    compact=True leaves out indentation and spaces.
+    """
+    if compact:
+        encode = json.JSONEncoder(separators=(",", ":")).encode
+        head = '{"tag":%s,"text":%s,"children":[' % (encode(root.tag), encode(root.text))
+        item_prefix, tail = "", "]}"
+    else:
+        # Children of the root are nested two levels deep
+        encoder = json.JSONEncoder(indent=4)
+        encode = lambda data: encoder.encode(data).replace("\n", "\n        ")
+        head = '{\n    "tag": %s,\n    "text": %s,\n    "children": [' % (encoder.encode(root.tag), encoder.encode(root.text))
+        item_prefix = "\n        "
+        tail = "\n    ]\n}" if root.children else "]\n}"
+
+    with open(file_name, 'w', buffering=WRITE_BUFFER_SIZE) as file:
+        file.write(head)
+        for index, child in enumerate(root.children):
+            if index:
+                file.write(",")
+            file.write(item_prefix)
+            file.write(encode(dict_from_node(child)))
+        file.write(tail)
+
+
+def write_ndjson(root, file_name):
+    """
+    Write the document as newline-delimited JSON: the first line holds the root
+    tag and text, every next line one child of the root (one property) with its
+    subtree, so other tools can read the file line by line.
+    """
+    dump = json.JSONEncoder(separators=(",", ":")).encode
+    with open(file_name, 'w', buffering=WRITE_BUFFER_SIZE) as file:
+        file.write(dump({"tag": root.tag, "text": root.text, "children": []}))
+        file.write("\n")
+        for child in root.children:
+            file.write(dump(dict_from_node(child)))
+            file.write("\n")
+
+
+class NdjsonReader:
+    """
+    Reads a file written by write_ndjson and hands out the children of the root
+    as XmlNode batches, one line is parsed at a time.
+    """
+
+    def __init__(self, json_file, batch_size=500):
+        self.json_file = json_file
+        self.batch_size = batch_size
+        self.root_tag = None
+        self.root_attrib = {}  # Attributes of the root are stored as its child nodes
+        self.root_text = ""
+        self.progress = 0  # Percentage of the file that has been read
+
+    def batches(self):
+        file_size = os.path.getsize(self.json_file) or 1
+
+        with open(self.json_file, 'rb') as json_file:
+            batch = []
+            for line_number, line in enumerate(json_file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Invalid JSON on line {line_number}: {e}") from None
+
+                if self.root_tag is None:
+                    self.root_tag = data["tag"]
+                    self.root_text = data.get("text") or ""
+                    continue
+
+                batch.append(node_from_dict(data))
+                if len(batch) >= self.batch_size:
+                    self.progress = int(json_file.tell() / file_size * 100)
+                    yield batch
+                    batch = []
+
+            self.progress = 100
+            if batch:
+                yield batch
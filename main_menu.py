@@ -12,10 +12,15 @@ class MainMenu(QMenuBar):
         file_menu = self.addMenu("File")
         file_menu.addAction(self.parent.download_action)
         file_menu.addAction(self.parent.open_xml_action)
+        file_menu.addAction(self.parent.open_with_actions_action)
         file_menu.addAction(self.parent.save_as_action)
         file_menu.addAction(self.parent.clear_tree_action)
 
         edit_menu = self.addMenu("Edit")
+        edit_menu.aboutToShow.connect(self.parent.update_undo_actions)
+        edit_menu.addAction(self.parent.undo_action)
+        edit_menu.addAction(self.parent.redo_action)
+        edit_menu.addSeparator()
         edit_menu.addAction(self.parent.edit_node_action)
         edit_menu.addAction(self.parent.remove_type_action)
         edit_menu.addAction(self.parent.add_subnode_action)
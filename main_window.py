@@ -1,6 +1,8 @@
 from datetime import datetime
+from contextlib import ExitStack
 import json
 import os
+import re
 import sys
 import time
 from configparser import ConfigParser
@@ -8,10 +10,15 @@ from configparser import ConfigParser
 import requests
 from PySide6.QtCore import Qt, QThread, Slot, Signal, QTimer
 from PySide6.QtWidgets import QMainWindow, QFileDialog, QHBoxLayout, QWidget, QMessageBox, QTabWidget, QSplitter, \
-    QInputDialog, QTreeWidgetItem, QProgressDialog, QLabel, QVBoxLayout, QDialog
-from PySide6.QtGui import QIcon, QAction, QPainter, QColor
+    QInputDialog, QProgressDialog, QLabel, QVBoxLayout, QDialog
+from PySide6.QtGui import QIcon, QAction, QPainter, QColor, QKeySequence
 
+from action_plan import split_pushdown
 from app_state import AppState
+from description_cleaner import DescriptionCleaner
+from feed_snapshot import SNAPSHOT_MAX_AGE_DAYS, SNAPSHOT_MAX_SIZE_MB
+from http_cache import HTTP_CACHE_MAX_SIZE_MB
+from page_scraper import SCRAPING_CONCURRENCY, SCRAPING_POOL_SIZE, SCRAPING_URL
 from main_menu import MainMenu
 from sidebar import Sidebar
 from statusbar import StatusBar
@@ -158,6 +165,13 @@ class MainWindow(QMainWindow):
 
         self.lextrus_xml_url = None
         self.xml_download_path = None
+        self.snapshot_max_age_days = SNAPSHOT_MAX_AGE_DAYS
+        self.snapshot_max_size_mb = SNAPSHOT_MAX_SIZE_MB
+        self.scraping_url = SCRAPING_URL
+        self.scraping_concurrency = SCRAPING_CONCURRENCY
+        self.scraping_pool_size = SCRAPING_POOL_SIZE
+        self.http_cache_max_size_mb = HTTP_CACHE_MAX_SIZE_MB
+        self.description_cleaner = DescriptionCleaner()
 
         # Load settings from the INI file
         self.load_settings()
@@ -175,6 +189,10 @@ class MainWindow(QMainWindow):
         self.open_xml_action = QAction(QIcon("./icons/xml.png"), "Open XML", self)
         self.open_xml_action.triggered.connect(self.open_file)
 
+        self.open_with_actions_action = QAction(QIcon("./icons/xml.png"), "Open XML with Action List", self)
+        self.open_with_actions_action.setToolTip("Open XML and apply the loaded group actions while it is parsed")
+        self.open_with_actions_action.triggered.connect(self.open_file_with_actions)
+
         self.save_as_action = QAction(QIcon("./icons/save.png"), "Save File As...", self)
         self.save_as_action.triggered.connect(self.save_file_as)
 
@@ -192,6 +210,14 @@ class MainWindow(QMainWindow):
         self.remove_type_action.setShortcut("Ctrl+R")
         self.remove_type_action.triggered.connect(self.remove_node_type)
 
+        self.undo_action = QAction("Undo", self)
+        self.undo_action.setShortcut(QKeySequence.Undo)
+        self.undo_action.triggered.connect(self.undo)
+
+        self.redo_action = QAction("Redo", self)
+        self.redo_action.setShortcut(QKeySequence.Redo)
+        self.redo_action.triggered.connect(self.redo)
+
         self.norm_price_action = QAction(QIcon("./icons/coin.png"), "Normalize Prices", self)
         self.norm_price_action.triggered.connect(self.process_prices)
 
@@ -280,12 +306,27 @@ class MainWindow(QMainWindow):
         # Store threads and workers
         self.threads = []
         self.workers = []
+        self.action_step = None  # Undo step of the running action list
 
         self.state.property_count_updated.connect(self.status_bar.update_property_count_label)
+        # The action preview counts against the open document
+        self.state.property_count_updated.connect(lambda count: self.tab_group_actions.update_list_view())
 
         self.loading_overlay = LoadingOverlay()
         self.loading_overlay.setParent(self)
 
+        # Everything that can change the document, off while a worker reads or changes it
+        self.document_busy = False
+        self.document_actions = [
+            self.open_xml_action, self.open_with_actions_action, self.download_action, self.save_as_action,
+            self.clear_tree_action, self.edit_node_action, self.add_subnode_action, self.remove_type_action,
+            self.norm_price_action, self.remove_from_start_action, self.undo_action, self.redo_action,
+        ]
+        self.document_widgets = [
+            self.tree, self.tab_group_actions, self.tab_scraping, self.tab_filter_by_id,
+            self.tab_check_media_links, self.tab_find_phones,
+        ]
+
 
 # SETTINGS
 
@@ -295,6 +336,20 @@ class MainWindow(QMainWindow):
             config.read('settings.ini')
             self.lextrus_xml_url = config.get('Settings', 'LEXTRUS_XML_URL')
             self.xml_download_path = config.get('Settings', 'XML_DOWNLOAD_PATH')
+            self.snapshot_max_age_days = config.getint('Settings', 'SNAPSHOT_MAX_AGE_DAYS', fallback=SNAPSHOT_MAX_AGE_DAYS)
+            self.snapshot_max_size_mb = config.getint('Settings', 'SNAPSHOT_MAX_SIZE_MB', fallback=SNAPSHOT_MAX_SIZE_MB)
+            self.scraping_url = config.get('Settings', 'SCRAPING_URL', fallback=SCRAPING_URL)
+            self.scraping_concurrency = config.getint('Settings', 'SCRAPING_CONCURRENCY', fallback=SCRAPING_CONCURRENCY)
+            self.scraping_pool_size = config.getint('Settings', 'SCRAPING_POOL_SIZE', fallback=SCRAPING_POOL_SIZE)
+            # 0 turns the scraping cache off
+            self.http_cache_max_size_mb = config.getint('Settings', 'HTTP_CACHE_MAX_SIZE_MB', fallback=HTTP_CACHE_MAX_SIZE_MB)
+
+            rules_file = config.get('Settings', 'DESCRIPTION_RULES', fallback=None)
+            if rules_file:
+                try:
+                    self.description_cleaner = DescriptionCleaner.from_file(rules_file)
+                except (OSError, ValueError, re.error) as e:
+                    QMessageBox.warning(self, "Error", f"Description rules weren't loaded, default rules are used:\n{e}")
         else:
             QMessageBox.warning(self, "Error", "Some functions won't be working! settings.ini file wasn't found!")
 
@@ -306,7 +361,7 @@ class MainWindow(QMainWindow):
 
             # If the user selected a valid number and an action, apply the action
             if number > 0 and action:
-                self.tree.trim_tree(self.tree.topLevelItem(0), number, position, action)
+                self.tree.trim_tree(self.tree.document.root, number, position, action)
 
         QMessageBox.warning(self, "Operation complete", "Properties was removed/preserved by the selected condition.")
 
@@ -442,16 +497,46 @@ class MainWindow(QMainWindow):
 
     def open_file(self):
         options = QFileDialog.Option.ReadOnly
-        xml_file, _ = QFileDialog.getOpenFileName(self, "Open XML File", "./XML/", "XML Files (*.xml);;All Files (*)",
+        xml_file, _ = QFileDialog.getOpenFileName(self, "Open XML File", "./XML/",
+                                                  "XML Files (*.xml);;NDJSON Files (*.ndjson);;All Files (*)",
                                                   options=options)
         print(xml_file)
         if xml_file:
             try:
-                self.tree.load_xml(xml_file)
+                if xml_file.endswith(".ndjson"):
+                    self.tree.load_ndjson(xml_file)
+                else:
+                    self.tree.load_xml(xml_file)
                 self.setWindowTitle(f"Lextrus XML Edit: {xml_file}")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to load XML file:\n{str(e)}")
 
+    def open_file_with_actions(self):
+        actions = self.tab_group_actions.actions
+        if not actions:
+            QMessageBox.information(self, "Error", "Load an action list in Group Actions first.")
+            return
+
+        options = QFileDialog.Option.ReadOnly
+        xml_file, _ = QFileDialog.getOpenFileName(self, "Open XML File", "./XML/", "XML Files (*.xml);;All Files (*)",
+                                                  options=options)
+        if not xml_file:
+            return
+
+        # Leading removal actions are applied while parsing, the rest runs after loading as usual
+        removal_actions, remaining_actions = split_pushdown(actions)
+        try:
+            removed = self.tree.load_xml(xml_file, removal_actions)
+            self.setWindowTitle(f"Lextrus XML Edit: {xml_file}")
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to load XML file:\n{str(e)}")
+            return
+
+        print(f"{removed} items removed by {len(removal_actions)} actions while parsing")
+        self.status_bar.show_message(f"{removed} items removed by {len(removal_actions)} actions while parsing")
+        if remaining_actions:
+            self.start_actions(remaining_actions)
+
     def open_close_properties(self):
         self.tree.toggle_second_level_visibility()
 
@@ -461,43 +546,46 @@ class MainWindow(QMainWindow):
     def save_file_as(self):
         options = QFileDialog.Option.DontUseNativeDialog
         file_name, selected_filter = QFileDialog.getSaveFileName(self, "Save File As", "",
-                                                   "XML Files (*.xml);;JSON Files (*.json);;All Files (*)",
+                                                   "XML Files (*.xml);;JSON Files (*.json);;"
+                                                   "Compact JSON Files (*.json);;NDJSON Files (*.ndjson);;All Files (*)",
                                                    options=options)
         if file_name:
-            if not (file_name.endswith(".xml") or file_name.endswith(".json")):
+            if not file_name.endswith((".xml", ".json", ".ndjson")):
                 # Append the correct suffix based on the selected filter
                 if "XML Files (*.xml)" in selected_filter:
                     file_name += ".xml"
                 elif "JSON Files (*.json)" in selected_filter:
                     file_name += ".json"
+                elif "NDJSON Files (*.ndjson)" in selected_filter:
+                    file_name += ".ndjson"
 
             # Save based on the file extension
             if file_name.endswith(".xml"):
                 self.tree.save_as_xml(file_name)
             elif file_name.endswith(".json"):
-                self.tree.save_as_json(file_name)
+                self.tree.save_as_json(file_name, compact=selected_filter.startswith("Compact"))
+            elif file_name.endswith(".ndjson"):
+                self.tree.save_as_ndjson(file_name)
             else:
-                QMessageBox.warning(self, "Invalid Format", "Only XML and JSON formats are supported.")
+                QMessageBox.warning(self, "Invalid Format", "Only XML, JSON and NDJSON formats are supported.")
 
     def clear_tree(self):
         self.tree.clear()
         self.setWindowTitle(f"Lextrus XML Edit")
 
     def edit_node(self):
-        selected_items = self.tree.selectedItems()
-        if selected_items:
-            selected_item = selected_items[0]
-            if selected_item.childCount() == 0:
-                self.tree.edit_item(selected_item, column=1)
+        selected_item = self.tree.selected_node()
+        if selected_item:
+            if selected_item.child_count() == 0:
+                self.tree.edit_node_value(selected_item)
             else:
                 msgBox = QMessageBox()
                 msgBox.setText("Parent node has no value to edit.")
                 msgBox.exec()
 
     def add_subnode(self):
-        selected_items = self.tree.selectedItems()
-        if selected_items:
-            selected_item = selected_items[0]
+        selected_item = self.tree.selected_node()
+        if selected_item:
             text, ok = QInputDialog.getText(self, "Input node name", "Enter node name:")
             if ok and text:
                 new_node = dict()
@@ -516,49 +604,80 @@ class MainWindow(QMainWindow):
             QMessageBox.No  # Default button
         )
         if reply == QMessageBox.Yes:
-            selected_items = self.tree.selectedItems()
-            if selected_items:
-                selected_item = selected_items[0]
-                parent_node = selected_item.parent()
-                parent_node_type = parent_node.text(0)
-                local_root = parent_node.parent()
+            selected_item = self.tree.selected_node()
+            if selected_item and selected_item.parent:
+                parent_node = selected_item.parent
+                parent_node_type = parent_node.tag
+                local_root = parent_node.parent
                 if local_root:
-                    child_index = parent_node.indexOfChild(selected_item)
-                    for index in range(local_root.childCount()):
+                    child_index = selected_item.row()
+                    nodes_to_remove = []
+                    for sibling in local_root.children:
                         # get the child of local root and delete child by index
-                        if local_root.child(index).text(0) == parent_node_type:
-                            local_root.child(index).removeChild(local_root.child(index).child(child_index))
+                        if sibling.tag == parent_node_type and sibling.child(child_index):
+                            nodes_to_remove.append(sibling.child(child_index))
+                    with self.tree.journal.step("Remove node type"):
+                        self.tree.remove_nodes(nodes_to_remove)
                 else:
-                    parent_node.removeChild(selected_item)
+                    self.tree.remove_node(selected_item)
 
     def insert_scraped_data(self, data_string):
         scraped_data = json.loads(data_string)
         property_id = scraped_data['ID']
-        property_node = self.state.current_property_node
-        if property_node.child(0).text(1) == property_id:
+        # The scraper runs ahead of this slot, so the property is looked up by its ID
+        property_node = self.tree.document.store.find_by_id(property_id)
+        if property_node is not None:
             scraped_data.pop("ID")  # remove ID info from dictionary
-            for item in scraped_data:
-                base_node = QTreeWidgetItem(property_node, [item, ])
-                data = scraped_data.get(item, {})
-                for key, value in data.items():
-                    key = (key.lower()).replace(" ", "_").replace(",", "_").replace("'", "")
-                    if key and value:
-
-                        comma_index = value.find(',')  # check value for commas
-                        if comma_index != -1:
-                            value = value[:comma_index] + ':' + value[comma_index + 1:]
-
-                        dict_node = QTreeWidgetItem(base_node, [key, value])
-
-                    elif key and not value:
-                        dict_node = QTreeWidgetItem(base_node, [key, "1"])
-
-                # Expand the property node to show the newly added items
-                property_node.setExpanded(True)
+            with self.tree.journal.step("Insert scraped data"):
+                for item in scraped_data:
+                    base_node = self.tree.append_node(property_node, item)
+                    data = scraped_data.get(item, {})
+                    for key, value in data.items():
+                        key = (key.lower()).replace(" ", "_").replace(",", "_").replace("'", "")
+                        if key and value:
+
+                            comma_index = value.find(',')  # check value for commas
+                            if comma_index != -1:
+                                value = value[:comma_index] + ':' + value[comma_index + 1:]
+
+                            dict_node = self.tree.append_node(base_node, key, value)
+
+                        elif key and not value:
+                            dict_node = self.tree.append_node(base_node, key, "1")
+
+                    # Expand the property node to show the newly added items
+                    self.tree.expand(self.tree.xml_model.index_from_node(property_node))
+
+    def undo(self):
+        name = self.tree.undo()
+        if name is not None:
+            self.status_bar.show_message_timeout(f"Undone: {name}")
+
+    def redo(self):
+        name = self.tree.redo()
+        if name is not None:
+            self.status_bar.show_message_timeout(f"Redone: {name}")
+
+    def update_undo_actions(self):
+        # Called before the Edit menu is shown
+        journal = self.tree.journal
+        self.undo_action.setEnabled(not self.document_busy and journal.can_undo())
+        self.undo_action.setText(f"Undo {journal.undo_name()}".strip())
+        self.redo_action.setEnabled(not self.document_busy and journal.can_redo())
+        self.redo_action.setText(f"Redo {journal.redo_name()}".strip())
+
+    def set_document_busy(self, busy):
+        # A worker builds its changes from the document, nothing else may edit it until it is finished
+        self.document_busy = busy
+        for action in self.document_actions:
+            action.setEnabled(not busy)
+        for widget in self.document_widgets:
+            widget.setEnabled(not busy)
+        self.update_undo_actions()
 
     def process_prices(self):
         print("Processing prices start")
-        if self.tree.topLevelItemCount() > 0:
+        if self.tree.has_document():
             print("Start tree method")
             self.tree.process_price_nodes()
             QMessageBox.information(self, "Finished", "The prices have been corrected.")
@@ -568,26 +687,26 @@ class MainWindow(QMainWindow):
 # Service Functions
     @Slot(int)
     def update_progress_bar(self, value):
-        self.status_bar.progress_bar.setValue(value)
+        self.status_bar.update_progress(value)
     def get_stylesheet(self):
         return """
             QMainWindow {
                 background-color: #f0f2f5;
             }
-            QTreeWidget {
+            QTreeView {
                 border: none;
                 background-color: #ffffff;
                 font-size: 14px;
                 padding: 6px;
             }
-            QTreeWidget::item {
+            QTreeView::item {
                 margin: 1px;
                 padding: 3px;
             }
-            QTreeWidget::item:hover {
+            QTreeView::item:hover {
                 background-color: #eff5f9;
             }
-            QTreeWidget::item:selected {
+            QTreeView::item:selected {
                 background-color: #2794f2;
             }
     
@@ -668,32 +787,56 @@ class MainWindow(QMainWindow):
 
         worker.moveToThread(thread)
 
+        self.set_document_busy(True)
+        if actions is not None:
+            # The worker only reads the document, the changes it computes and
+            # the actions that need the tree run on this thread. The worker waits
+            # for them, the next stage reads the document they left
+            worker.changes_ready.connect(self.tree.apply_changes, Qt.BlockingQueuedConnection)
+            worker.action_ready.connect(self.run_tree_action, Qt.BlockingQueuedConnection)
+            # The whole list is one undo step
+            self.action_step = ExitStack()
+            self.action_step.enter_context(self.tree.journal.step("Group actions"))
+
         self.start_progress_bar()
 
         worker.progress_updated.connect(self.update_progress_bar)
+        worker.plan_ready.connect(self.status_bar.show_message)
+        worker.progress_message.connect(self.status_bar.show_message)
         worker.finished.connect(self.on_worker_finished)
         worker.finished.connect(thread.quit)
         worker.finished.connect(worker.deleteLater)
         thread.finished.connect(thread.deleteLater)
 
         print("Before worker run")
-        thread.started.connect(lambda: worker.run())
+        thread.started.connect(worker.run)
 
         thread.start()
 
-        # Keep track of threads to ensure they are not destroyed prematurely
+        # Keep track of threads and workers to ensure they are not destroyed prematurely
         self.threads.append(thread)
+        self.workers.append(worker)
         thread.finished.connect(lambda: self.threads.remove(thread))
+        thread.finished.connect(lambda: self.workers.remove(worker))
+
+    @Slot(object, object)
+    def run_tree_action(self, action, progress_callback):
+        # Actions that are not fused are methods of the tree, run on the GUI thread
+        getattr(self.tree, action["action"])(progress_callback, action)
 
     def start_progress_bar(self):
         self.status_bar.start_progress()
     @Slot(int)
     def update_progress_bar(self, value):
-        self.status_bar.progress_bar.setValue(value)
+        self.status_bar.update_progress(value)
 
     @Slot()
     def on_worker_finished(self, task_type=None):
         # Reset progress bar and clear status message
+        if self.action_step is not None:
+            self.action_step.close()
+            self.action_step = None
+        self.set_document_busy(False)
         self.status_bar.stop_progress()
         self.status_bar.show_message("")
         if task_type is not None:
@@ -0,0 +1,305 @@
+import ast
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import requests
+import soupsieve
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import etree
+from requests.adapters import HTTPAdapter
+
+# Page of a property on the site, SCRAPING_URL in settings.ini can point it to
+# another server (e.g. http://127.0.0.1:8000/property-{property_id}/ for a local copy)
+SCRAPING_URL = "https://lextrusrealestate.com/property-{property_id}/"
+# Pages requested at the same time, and keep-alive connections kept open to the site
+SCRAPING_CONCURRENCY = 8
+SCRAPING_POOL_SIZE = 8
+SCRAPING_TIMEOUT = 30  # Seconds per request
+
+# Everything that is scraped is inside this element
+DETAILS_ID = "estatebud-property-details"
+# Start tag of the details container, the page is only parsed from here on
+DETAILS_START = re.compile(rf"""<div\b[^>]*?\bid\s*=\s*["']?{DETAILS_ID}["'\s/>]""", re.IGNORECASE)
+PARSE_CHUNK = 16 * 1024  # Characters fed to the parser at a time
+# Compound selectors css_to_xpath() understands: an optional type, then classes, IDs and attributes
+CSS_COMPOUND = re.compile(r"([A-Za-z][\w-]*|\*)?((?:[.#][\w-]+|\[[\w-]+(?:=(?:\"[^\"]*\"|'[^']*'|[\w-]+))?\])*)")
+CSS_NAME = re.compile(r"[A-Za-z][\w-]*")
+CSS_SIMPLE = re.compile(r"([.#\[])([\w-]+)(?:=(\"[^\"]*\"|'[^']*'|[\w-]+))?\]?")
+
+
+def parse_scrap_item(item_str):
+    # Scraping list entries are stored as the str() of a dict
+    return ast.literal_eval(item_str)
+
+
+def check_scrap_items(scrap_items):
+    """
+    Split scraping list items into the ones that can be used and
+    (item, error message) for the others, e.g. a name path that is not a
+    valid CSS selector. Checked once before the pages are fetched, so a bad
+    item is reported instead of failing on every page.
+    """
+    usable, skipped = [], []
+    for item in scrap_items:
+        try:
+            item['dict_name']
+            if scrap_item_paths(item) is None:
+                # Looked up with BeautifulSoup, which needs a selector soupsieve understands
+                soupsieve.compile(item['path_to_param_name'])
+        except KeyError as e:
+            skipped.append((item, f"missing {e}"))
+        except (TypeError, soupsieve.SelectorSyntaxError) as e:
+            skipped.append((item, str(e).splitlines()[0]))
+        else:
+            usable.append(item)
+    return usable, skipped
+
+
+def scrap_item_paths(item):
+    """
+    (XPath of the item's elements, XPath of the name inside an element), or
+    None when they can't be translated and the item is looked up with
+    BeautifulSoup instead.
+    """
+    return item_paths(item['param_tag_type'], item['param_tag_class'], item['path_to_param_name'])
+
+
+@lru_cache(maxsize=64)
+def item_paths(tag, css_class, name_selector):
+    try:
+        paths = elements_xpath(tag, css_class), css_to_xpath(name_selector)
+        for path in paths:
+            etree.XPath(path)
+    except (ValueError, etree.XPathSyntaxError):
+        return None
+    return paths
+
+
+def scrape_page(html, scrap_items):
+    """
+    Groups of name -> value pairs found on a property page, one per scraping
+    list item ({dict_name: {name: value}}), or None when the page has no
+    property details. Only elements inside the details container are looked
+    at, see parse_details(). They are searched with XPath; name paths that
+    css_to_xpath() can't translate are looked up with BeautifulSoup on the
+    details container alone.
+    """
+    start = DETAILS_START.search(html)
+    if start is None:
+        return None
+    container = parse_details(html, start.start())
+    if container is None:
+        return None
+
+    scraped_data = {}
+    soup = None
+    for item in scrap_items:
+        paths = scrap_item_paths(item)
+        if paths is None:
+            if soup is None:
+                soup = BeautifulSoup(html[start.start():], 'lxml', parse_only=SoupStrainer('div', id=DETAILS_ID))
+            pairs = soup_pairs(soup, item)
+        else:
+            elements_path, name_path = paths
+            pairs = []
+            for element in container.xpath(elements_path):
+                names = element.xpath(name_path)
+                pairs.append((element_text(element), element_text(names[0], strip=True) if names else None))
+
+        item_dict = {}
+        for text, name_text in pairs:
+            if ':' in text:
+                cleaned_name = name_text.rstrip(':') if name_text is not None else None
+            elif ',' in text:
+                cleaned_name = name_text.rstrip(',') if name_text is not None else None
+            else:
+                cleaned_name = name_text
+
+            value = ""
+            if ':' in text:
+                value = text.split(':')[-1].strip()
+            elif ',' in text:
+                value = text.split(',')[-1].strip()
+
+            if cleaned_name:
+                item_dict[cleaned_name] = value
+
+        if item_dict:
+            scraped_data[item['dict_name']] = item_dict
+
+    return scraped_data
+
+
+def parse_details(html, start):
+    """
+    The details container as an lxml element, or None. Only the markup from
+    its start tag on is parsed, in chunks, and parsing stops as soon as the
+    container is closed: the head, scripts and everything before and after the
+    details are never turned into elements.
+    """
+    parser = etree.HTMLPullParser(events=("end",), tag="div")
+    try:
+        for position in range(start, len(html), PARSE_CHUNK):
+            parser.feed(html[position:position + PARSE_CHUNK])
+            for _, element in parser.read_events():
+                if element.get("id") == DETAILS_ID:
+                    return element
+        # Not closed before the end of the page
+        parser.close()
+    except etree.LxmlError:
+        return None
+    for _, element in parser.read_events():
+        if element.get("id") == DETAILS_ID:
+            return element
+    return None
+
+
+def soup_pairs(soup, item):
+    # (element text, name text or None) of every element of a scraping list item, found with BeautifulSoup
+    pairs = []
+    for element in soup.find_all(item['param_tag_type'], class_=item['param_tag_class']):
+        name = element.select_one(item['path_to_param_name'])
+        pairs.append((element.get_text(), name.get_text(strip=True) if name else None))
+    return pairs
+
+
+def element_text(element, strip=False):
+    # Same text as BeautifulSoup's get_text(): text nodes below element, without comments and scripts
+    texts = element.xpath(".//text()[not(parent::script or parent::style)]")
+    if strip:
+        return "".join(text.strip() for text in texts)
+    return "".join(texts)
+
+
+def elements_xpath(tag, css_class):
+    # XPath for find_all(tag, class_=css_class) below the context element
+    if tag and not CSS_NAME.fullmatch(tag):
+        raise ValueError(f"Unsupported tag: {tag!r}")
+    predicate = ""
+    if css_class:
+        # Like BeautifulSoup, a class with spaces has to match the whole attribute
+        predicate = f"[@class={xpath_string(css_class)}]" if " " in css_class else class_predicate(css_class)
+    return f".//{(tag or '*').lower()}{predicate}"
+
+
+@lru_cache(maxsize=64)
+def css_to_xpath(selector):
+    """
+    Translate a CSS selector for select_one() into an XPath below the context
+    element: type selectors, *, .class, #id, [attribute] and [attribute=value],
+    joined by descendant (space) and child (>) combinators. Ancestors may be
+    outside the context element, like in soupsieve. Raises ValueError for
+    anything else.
+    """
+    parts = re.split(r'\s*(>)\s*|\s+', selector.strip())
+    condition = None
+    for index in range(0, len(parts), 2):
+        step = compound_xpath(parts[index])
+        if condition is not None:
+            axis = "parent" if parts[index - 1] == ">" else "ancestor"
+            step = f"{step}[{axis}::{condition}]"
+        condition = step
+    return f"descendant::{condition}"
+
+
+def compound_xpath(compound):
+    match = CSS_COMPOUND.fullmatch(compound or "")
+    if match is None or not compound:
+        raise ValueError(f"Unsupported selector: {compound!r}")
+    tag, simple_selectors = match.groups()
+    step = (tag or "*").lower()
+    for kind, name, value in CSS_SIMPLE.findall(simple_selectors):
+        if kind == ".":
+            step += class_predicate(name)
+        elif kind == "#":
+            step += f"[@id={xpath_string(name)}]"
+        elif value:
+            if value[0] in "'\"":
+                value = value[1:-1]
+            step += f"[@{name}={xpath_string(value)}]"
+        else:
+            step += f"[@{name}]"
+    return step
+
+
+def class_predicate(css_class):
+    return f"[contains(concat(' ', normalize-space(@class), ' '), {xpath_string(f' {css_class} ')})]"
+
+
+def xpath_string(value):
+    if "'" not in value:
+        return f"'{value}'"
+    if '"' not in value:
+        return f'"{value}"'
+    raise ValueError(f"Unsupported value: {value!r}")
+
+
+class PageScraper:
+    """
+    Fetches and parses the pages of many properties at once. Requests run on
+    a bounded thread pool and share one keep-alive session, whose connection
+    pool is never larger than pool_size. Results are handed out in the order
+    of the property IDs, whatever order the pages arrive in. With an
+    HttpCache, pages that did not change are revalidated instead of
+    downloaded again. Scraping list items that can't be used are left out
+    and listed in skipped_items.
+    """
+
+    def __init__(self, scrap_items, url_template=SCRAPING_URL, concurrency=SCRAPING_CONCURRENCY,
+                 pool_size=SCRAPING_POOL_SIZE, timeout=SCRAPING_TIMEOUT, cache=None):
+        self.scrap_items, self.skipped_items = check_scrap_items(scrap_items)
+        self.cache = cache
+        self.url_template = url_template
+        self.concurrency = max(1, concurrency)
+        self.pool_size = max(1, pool_size)
+        self.timeout = timeout
+
+    def create_session(self):
+        session = requests.Session()
+        # pool_block: requests wait for a free connection instead of opening extra ones
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=True)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def fetch(self, session, property_id):
+        # Scraped groups of one property, None if the page is missing or has no details
+        url = self.url_template.format(property_id=property_id)
+        cached = self.cache.load(url) if self.cache is not None else None
+        try:
+            response = session.get(url, timeout=self.timeout,
+                                   headers=cached.conditional_headers() if cached is not None else None)
+            if response.status_code == 304 and cached is not None:
+                self.cache.hit(cached)
+                return scrape_page(cached.text, self.scrap_items)
+            response.raise_for_status()
+        except requests.exceptions.RequestException:
+            return None
+        if self.cache is not None:
+            self.cache.store(url, response)
+        return scrape_page(response.text, self.scrap_items)
+
+    def scrape(self, property_ids):
+        """
+        Yield (property_id, scraped groups or None) for every ID, in order.
+        A few pages per worker are requested ahead, so a slow page holds back
+        the results after it but never the requests.
+        """
+        with self.create_session() as session, ThreadPoolExecutor(self.concurrency) as executor:
+            pending = deque()
+            property_ids = iter(property_ids)
+            for property_id in property_ids:
+                pending.append((property_id, executor.submit(self.fetch, session, property_id)))
+                if len(pending) >= self.concurrency * 4:
+                    break
+            while pending:
+                property_id, future = pending.popleft()
+                result = future.result()
+                next_id = next(property_ids, None)
+                if next_id is not None:
+                    pending.append((next_id, executor.submit(self.fetch, session, next_id)))
+                yield property_id, result
+        if self.cache is not None:
+            self.cache.evict()
@@ -0,0 +1,98 @@
+import time
+
+# Progress reports per second, more is not visible and only costs signal traffic
+FRAME_RATE = 10
+
+
+class ProgressTracker:
+    """
+    Progress of a long operation made of one or more stages (the passes of an
+    action plan, the properties of a scraping run...). Stages may report after
+    every item, report(percent, text) is only called FRAME_RATE times per
+    second and once when a stage starts or the operation is finished.
+    percent covers all stages, text holds the stage, items/s and the ETA.
+    """
+
+    def __init__(self, report, stages=1, frame_rate=FRAME_RATE, clock=time.monotonic):
+        self.report = report
+        self.stages = max(stages, 1)
+        self.interval = 1 / frame_rate
+        self.clock = clock
+        self.started = clock()
+        self.stage_index = -1
+        self.stage_name = ""
+        self.stage_total = 0  # Items of the current stage, 0 if unknown
+        self.stage_done = 0
+        self.stage_started = self.started
+        self._last_report = None
+
+    def start_stage(self, name="", total=0):
+        self.stage_index = min(self.stage_index + 1, self.stages - 1)
+        self.stage_name = name
+        self.stage_total = total
+        self.stage_done = 0
+        self.stage_started = self.clock()
+        self.emit()
+
+    def advance(self, count=1):
+        self.set_done(self.stage_done + count)
+
+    def set_done(self, done):
+        self.stage_done = done
+        now = self.clock()
+        if self._last_report is None or now - self._last_report >= self.interval:
+            self.emit(now)
+
+    def set_percent(self, value):
+        # For steps that report 0-100 of the current stage instead of items
+        self.set_done(value * (self.stage_total or 100) / 100)
+
+    def finish(self):
+        self.stage_index = self.stages - 1
+        self.stage_done = self.stage_total or 100
+        self.emit()
+
+    def emit(self, now=None):
+        self._last_report = now if now is not None else self.clock()
+        self.report(self.percent(), self.text(self._last_report))
+
+    def fraction(self):
+        stage_fraction = min(self.stage_done / (self.stage_total or 100), 1.0)
+        return (max(self.stage_index, 0) + stage_fraction) / self.stages
+
+    def percent(self):
+        return int(self.fraction() * 100)
+
+    def items_per_second(self, now):
+        elapsed = now - self.stage_started
+        return self.stage_done / elapsed if elapsed > 0 else 0.0
+
+    def eta(self, now):
+        # Seconds left, estimated from the pace of the whole operation so far
+        fraction = self.fraction()
+        if fraction <= 0:
+            return None
+        return (now - self.started) * (1 - fraction) / fraction
+
+    def text(self, now):
+        parts = [self.stage_name or "Working"]
+        if self.stages > 1:
+            parts[0] += f" ({self.stage_index + 1}/{self.stages})"
+        if self.stage_total:
+            parts.append(f"{int(self.stage_done)}/{self.stage_total}")
+            parts.append(f"{self.items_per_second(now):.0f} items/s")
+        eta = self.eta(now)
+        if eta is not None and self.fraction() < 1:
+            parts.append(f"ETA {format_seconds(eta)}")
+        return " · ".join(parts)
+
+
+def format_seconds(seconds):
+    seconds = int(seconds + 0.5)
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m {seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m"
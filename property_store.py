@@ -0,0 +1,410 @@
+import sys
+
+
+NUMERIC_CONDITIONS = ("greater than", "less than", "greater or equal", "less or equal")
+# The value of an "expression" action is a condition on the whole item (see condition_expression)
+EXPRESSION = "expression"
+CONDITIONS = ("", "equal", "contains", "does not contain") + NUMERIC_CONDITIONS + (EXPRESSION,)
+# Conditions on interned fields that are checked once per distinct value (see PropertyStore.match)
+INDEXED_CONDITIONS = ("equal", "contains", "does not contain")
+
+
+def to_number(value):
+    # Field texts that are not numbers compare as NaN, so numeric conditions are False for them
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def expected_number(expected_value):
+    try:
+        return float(expected_value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Numeric condition needs a number, got: {expected_value!r}") from None
+
+
+def check_condition(condition, expected_value, node_value):
+    match condition:
+        case "":
+            return True
+        case "equal":
+            return node_value == expected_value
+        case "contains":
+            return expected_value in node_value
+        case "does not contain":
+            return expected_value not in node_value
+        case "greater than":
+            return to_number(node_value) > expected_number(expected_value)
+        case "less than":
+            return to_number(node_value) < expected_number(expected_value)
+        case "greater or equal":
+            return to_number(node_value) >= expected_number(expected_value)
+        case "less or equal":
+            return to_number(node_value) <= expected_number(expected_value)
+        case _:
+            raise ValueError(f"Unsupported condition: {condition}")
+
+
+def id_key(property_id):
+    # IDs are compared as numbers when they are numeric, so "0123", "123" and 123 are the same property
+    if isinstance(property_id, str):
+        property_id = property_id.strip()
+        try:
+            return int(property_id)
+        except ValueError:
+            return property_id
+    return property_id
+
+
+def rounded_price(price):
+    # Prices are rounded up to whole thousands; None when the text is not a number or is already round
+    try:
+        value = int(float(price))
+    except ValueError:
+        return None
+    if value % 1000 != 0:
+        value = ((value // 1000) + 1) * 1000
+    return str(value) if str(value) != price else None
+
+
+def price_updates(store):
+    """(price node, new text) for every property whose price has to be rounded."""
+    prices = store.column('price')
+    for row in store.rows():
+        price = prices[row]
+        if price:
+            new_price = rounded_price(price)
+            if new_price is not None:
+                yield store.field_node(row, 'price'), new_price
+
+
+class PropertyStore:
+    """
+    Column-oriented copy of the known property fields. Row N of every column
+    belongs to the property node nodes[N]; a missing field is stored as None.
+
+    Group actions, filters and searches read the columns instead of walking the
+    nodes. The store is kept in sync by XmlDocument, which calls add(), discard()
+    and refresh() on every change of a property.
+
+    It also keeps an id -> property index, so properties can be found by their
+    <id> without a scan, and a value -> properties index for the interned
+    (low-cardinality) fields, so conditions on them only look at distinct values.
+
+    cache holds data other modules derive from the properties (e.g. the NumPy
+    arrays of vector_conditions); it is emptied on every change.
+    """
+    # Direct children of <property> (paths are resolved from the property node)
+    FIELDS = ("id", "ref", "type", "town", "province", "country", "price", "price_freq", "currency", "desc/en")
+    # Fields with few distinct values are interned so equal values share one string
+    INTERNED_FIELDS = ("type", "town", "province", "country", "price_freq", "currency")
+    IMAGES = "images"
+
+    def __init__(self):
+        self.nodes = []
+        self.columns = {}
+        self._rows = {}  # property node -> row
+        self._ids = {}   # id key -> property nodes with this id, in the order they were added
+        self._values = {}  # field -> value -> {property node: None}
+        self._removed = 0
+        self.cache = {}
+        self.clear()
+
+    def clear(self):
+        self.nodes = []
+        self.columns = {field: [] for field in self.FIELDS + (self.IMAGES,)}
+        self._rows = {}
+        self._ids = {}
+        self._values = {field: {} for field in self.INTERNED_FIELDS}
+        self._removed = 0
+        self.cache = {}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, node):
+        return node in self._rows
+
+    def rebuild(self, property_nodes):
+        self.clear()
+        for node in property_nodes:
+            self.add(node)
+
+    def add(self, node):
+        if node in self._rows:
+            self.refresh(node)
+            return
+        self.cache.clear()
+        values = self.extract(node)
+        self._rows[node] = len(self.nodes)
+        self.nodes.append(node)
+        for field, column in self.columns.items():
+            column.append(values[field])
+        self._index_id(values["id"], node)
+        for field in self.INTERNED_FIELDS:
+            self._index_value(field, values[field], node)
+
+    def discard(self, node):
+        row = self._rows.pop(node, None)
+        if row is None:
+            return
+        self.cache.clear()
+        self._unindex_id(self.columns["id"][row], node)
+        for field in self.INTERNED_FIELDS:
+            self._unindex_value(field, self.columns[field][row], node)
+        # Rows are only marked as removed, the columns are compacted in one go later
+        self.nodes[row] = None
+        self._removed += 1
+        if self._removed > len(self._rows):
+            self.compact()
+
+    def discard_many(self, nodes):
+        nodes = [node for node in nodes if node in self._rows]
+        if not nodes:
+            return
+        if len(nodes) < len(self._rows) - len(nodes):
+            for node in nodes:
+                self.discard(node)
+            return
+
+        # Most rows go: drop them all and index the survivors again from their columns
+        self.cache.clear()
+        for node in nodes:
+            self.nodes[self._rows.pop(node)] = None
+        self.compact()
+        self._ids = {}
+        self._values = {field: {} for field in self.INTERNED_FIELDS}
+        for row, node in enumerate(self.nodes):
+            self._index_id(self.columns["id"][row], node)
+            for field in self.INTERNED_FIELDS:
+                self._index_value(field, self.columns[field][row], node)
+
+    def reorder(self, property_nodes):
+        """
+        Put the rows in the order of property_nodes, the order of the document.
+        add() appends, so this is called after properties were put back in the
+        middle of the document (e.g. by an undo).
+        """
+        self.cache.clear()
+        self.compact()
+        order = [self._rows[node] for node in property_nodes if node in self._rows]
+        self.nodes = [self.nodes[row] for row in order]
+        for field, column in self.columns.items():
+            self.columns[field] = [column[row] for row in order]
+        self._rows = {node: row for row, node in enumerate(self.nodes)}
+        # The id index keeps duplicates in document order, find_by_id() returns the first one
+        self._ids = {}
+        for row, node in enumerate(self.nodes):
+            self._index_id(self.columns["id"][row], node)
+
+    def refresh(self, node):
+        row = self._rows.get(node)
+        if row is None:
+            return
+        self.cache.clear()
+        values = self.extract(node)
+        old_values = {field: self.columns[field][row] for field in ("id",) + self.INTERNED_FIELDS}
+        for field, column in self.columns.items():
+            column[row] = values[field]
+
+        if values["id"] != old_values["id"]:
+            self._unindex_id(old_values["id"], node)
+            self._index_id(values["id"], node)
+        for field in self.INTERNED_FIELDS:
+            if values[field] != old_values[field]:
+                self._unindex_value(field, old_values[field], node)
+                self._index_value(field, values[field], node)
+
+    def refresh_child(self, node, child_tag):
+        """Update only the column fed by the <child_tag> children of a property after one of them changed."""
+        row = self._rows.get(node)
+        if row is None:
+            return
+        # Also for children without a column, the cache may hold data read from the nodes
+        self.cache.clear()
+        if child_tag == "desc":
+            field = "desc/en"
+            en_node = node.find_path(field)
+            value = en_node.text if en_node is not None else None
+        elif child_tag == self.IMAGES:
+            field = self.IMAGES
+            value = self.image_urls(node.find_child(self.IMAGES))
+        elif child_tag in self.columns:
+            field = child_tag
+            child = node.find_child(child_tag)
+            value = child.text if child is not None else None
+            if value is not None and field in self.INTERNED_FIELDS:
+                value = sys.intern(value)
+        else:
+            return  # Nothing in the store comes from this child
+        self.set_value(row, field, value)
+
+    def set_value(self, row, field, value):
+        column = self.columns[field]
+        old_value = column[row]
+        if old_value == value:
+            return
+        self.cache.clear()
+        column[row] = value
+        node = self.nodes[row]
+        if field == "id":
+            self._unindex_id(old_value, node)
+            self._index_id(value, node)
+        elif field in self._values:
+            self._unindex_value(field, old_value, node)
+            self._index_value(field, value, node)
+
+    def _index_id(self, property_id, node):
+        if property_id is not None:
+            self._ids.setdefault(id_key(property_id), []).append(node)
+
+    def _unindex_id(self, property_id, node):
+        if property_id is None:
+            return
+        key = id_key(property_id)
+        nodes = self._ids.get(key)
+        if nodes is None:
+            return
+        nodes.remove(node)
+        if not nodes:
+            del self._ids[key]
+
+    def _index_value(self, field, value, node):
+        if value is not None:
+            self._values[field].setdefault(value, {})[node] = None
+
+    def _unindex_value(self, field, value, node):
+        if value is None:
+            return
+        nodes = self._values[field].get(value)
+        if nodes is None:
+            return
+        nodes.pop(node, None)
+        if not nodes:
+            del self._values[field][value]
+
+    def compact(self):
+        self.cache.clear()
+        live_rows = [row for row, node in enumerate(self.nodes) if node is not None]
+        self.nodes = [self.nodes[row] for row in live_rows]
+        for field, column in self.columns.items():
+            self.columns[field] = [column[row] for row in live_rows]
+        self._rows = {node: row for row, node in enumerate(self.nodes)}
+        self._removed = 0
+
+    def extract(self, node):
+        values = dict.fromkeys(self.columns)
+        desc_node = None
+        images_node = None
+
+        for child in node.children:
+            tag = child.tag
+            if tag == "desc":
+                if desc_node is None:
+                    desc_node = child
+            elif tag == self.IMAGES:
+                if images_node is None:
+                    images_node = child
+            elif tag in values and values[tag] is None:
+                values[tag] = sys.intern(child.text) if tag in self.INTERNED_FIELDS else child.text
+
+        if desc_node is not None:
+            en_node = desc_node.find_child("en")
+            if en_node is not None:
+                values["desc/en"] = en_node.text
+
+        values[self.IMAGES] = self.image_urls(images_node)
+        return values
+
+    @staticmethod
+    def image_urls(images_node):
+        if images_node is None:
+            return None
+        urls = []
+        for image in images_node.children:
+            url_node = image.find_child("url")
+            if url_node is not None:
+                urls.append(url_node.text)
+        return tuple(urls)
+
+    # READ API
+
+    def rows(self):
+        """Live rows in document load order."""
+        return [row for row, node in enumerate(self.nodes) if node is not None]
+
+    def row_of(self, node):
+        return self._rows.get(node)
+
+    def node(self, row):
+        return self.nodes[row]
+
+    def find_by_id(self, property_id):
+        """First property with the given id, or None."""
+        nodes = self._ids.get(id_key(property_id))
+        return nodes[0] if nodes else None
+
+    def nodes_by_id(self, property_id):
+        return list(self._ids.get(id_key(property_id), ()))
+
+    def has_id(self, property_id):
+        return id_key(property_id) in self._ids
+
+    def ids(self):
+        """IDs of the live rows in document load order (None for properties without an id)."""
+        ids = self.columns["id"]
+        return [ids[row] for row in self.rows()]
+
+    def value(self, row, field):
+        return self.columns[field][row]
+
+    def column(self, field):
+        return self.columns[field]
+
+    def has_field(self, field):
+        return field in self.columns
+
+    def field_node(self, row, field):
+        """Resolve the node behind a column value, e.g. "desc/en" -> <en> node."""
+        node = self.nodes[row]
+        if node is None:
+            return None
+        return node.find_path(field)
+
+    def indexed(self, field, condition):
+        """True if match() answers the condition from an index instead of a scan of the column."""
+        if field == "id":
+            return condition == "equal"
+        return field in self._values and condition in INDEXED_CONDITIONS
+
+    def match(self, field, condition, expected_value):
+        """Rows whose field exists and satisfies the condition."""
+        if field in self._values:
+            return self._match_indexed(field, condition, expected_value)
+        if field == "id" and condition == "equal":
+            # The id index groups "0123" and "123", only the exact text is equal
+            rows = self._rows
+            return sorted(rows[node] for node in self._ids.get(id_key(expected_value), ())
+                          if self.columns["id"][rows[node]] == expected_value)
+
+        column = self.columns[field]
+        nodes = self.nodes
+
+        if condition == "equal":
+            return [row for row, value in enumerate(column)
+                    if value is not None and value == expected_value and nodes[row] is not None]
+
+        return [row for row, value in enumerate(column)
+                if value is not None and nodes[row] is not None and check_condition(condition, expected_value, value)]
+
+    def _match_indexed(self, field, condition, expected_value):
+        values = self._values[field]
+        if condition == "equal":
+            matched = [values.get(expected_value, {})]
+        else:
+            # The condition is checked once per distinct value, not once per property
+            matched = [nodes for value, nodes in values.items() if check_condition(condition, expected_value, value)]
+
+        rows = self._rows
+        return sorted(rows[node] for nodes in matched for node in nodes)
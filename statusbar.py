@@ -57,10 +57,8 @@ class StatusBar(QStatusBar):
         self.progress_bar.setValue(0)
 
     def update_progress(self, value):
-        new_value = self.progress_bar.value() + value
-        if new_value >= 100:
-            new_value = 100
-        self.progress_bar.setValue(new_value)
+        # value is the overall percentage, not an increment
+        self.progress_bar.setValue(max(0, min(value, 100)))
 
     def stop_progress(self):
         self.progress_bar.setVisible(False)
@@ -3,6 +3,8 @@ from PySide6.QtWidgets import QWidget, QVBoxLayout, QLabel, QListWidget, QFormLa
     QPushButton, QFileDialog, QMessageBox, QInputDialog
 from PySide6.QtCore import Qt
 
+from property_store import id_key
+
 
 class TabFilterById(QWidget):
     def __init__(self, parent=None):
@@ -102,7 +104,10 @@ class TabFilterById(QWidget):
             self.condition_list.addItem(f"Individual IDs: {', '.join(map(str, ids))}")
 
     def filter_properties(self, preserve=False):
-        root = self.parent.tree.topLevelItem(0)  # Get the root item
+        tree = self.parent.tree
+        root = tree.document.root  # Get the root node
+        if root is None:
+            return
         ids_to_keep = set()
 
         # Determine IDs to keep based on conditions
@@ -113,27 +118,29 @@ class TabFilterById(QWidget):
             elif condition[0] == 'individual':
                 ids_to_keep.update(condition[1])
 
-        # Iterate over properties and remove or preserve them
-        for i in range(root.childCount() - 1, -1, -1):  # Traverse in reverse order
-            property_item = root.child(i)
-            property_id = None
-
-            # Find the 'id' child of the property
-            for j in range(property_item.childCount()):
-                child_item = property_item.child(j)
-                if child_item.text(0) == 'id':
-                    property_id = int(child_item.text(1))
-                    break
-
-            # Decide whether to keep or remove the property
-            if preserve:
-                if property_id not in ids_to_keep:
-                    root.removeChild(property_item)
-            else:
-                if property_id in ids_to_keep:
-                    root.removeChild(property_item)
-
-            self.parent.state.set_property_count(self.parent.tree.count_properties())
+        store = tree.document.store
+        nodes_to_remove = []
+        if not preserve and len(ids_to_keep) < len(store):
+            # Fewer IDs than properties: look the IDs up in the index
+            for property_id in ids_to_keep:
+                nodes_to_remove.extend(store.nodes_by_id(property_id))
+        else:
+            # Decide for every property by its 'id' column value
+            ids = store.column('id')
+            for row in store.rows():
+                property_id = id_key(ids[row])
+
+                if preserve:
+                    if property_id not in ids_to_keep:
+                        nodes_to_remove.append(store.node(row))
+                else:
+                    if property_id in ids_to_keep:
+                        nodes_to_remove.append(store.node(row))
+
+        with tree.journal.step("Filter by ID"):
+            tree.remove_nodes(nodes_to_remove)
+
+        self.parent.state.set_property_count(tree.count_properties())
 
     def remove_by_conditions(self):
         self.filter_properties(preserve=False)
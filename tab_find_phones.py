@@ -5,6 +5,8 @@ import re
 import os
 import configparser
 
+from progress import ProgressTracker
+
 class EditDescriptionDialog(QDialog):
     def __init__(self, current_text, parent=None):
         super().__init__(parent)
@@ -372,7 +374,7 @@ class TabFindPhones(QWidget):
                 item.setForeground(QColor(0, 0, 0))
         
     def find_phones(self):
-        if self.parent.tree.topLevelItemCount() == 0:
+        if not self.parent.tree.has_document():
             QMessageBox.warning(self, "Error", "Load XML file first!")
             return
             
@@ -383,7 +385,7 @@ class TabFindPhones(QWidget):
         self.found_items = []
         self.current_item_index = -1
         
-        root_item = self.parent.tree.topLevelItem(0)
+        root_item = self.parent.tree.document.root
         if not root_item:
             return
             
@@ -394,70 +396,64 @@ class TabFindPhones(QWidget):
         keyword_count = 0
         total_properties = self.parent.state.get_property_count()
         
-        for i in range(root_item.childCount()):
-            property_item = root_item.child(i)
+        store = self.parent.tree.document.store
+        ids = store.column('id')
+        descriptions = store.column('desc/en')
+
+        # Progress is sent a few times per second instead of once per property
+        progress = ProgressTracker(lambda percent, message: self.progress_updated.emit(percent))
+        progress.start_stage("Searching phones", total_properties)
+        for row in store.rows():
+            checked_count += 1
+            progress.advance()
+
+            property_id = ids[row]
+            raw_description = descriptions[row]
+            if property_id is None or raw_description is None:
+                continue
+
+            matches_info = self.find_phone_matches(raw_description)
+            matches = matches_info['matches']
+            stats = matches_info['stats']
             
-            if property_item.text(0) == 'property':
-                checked_count += 1
-                progress = int((checked_count / total_properties) * 100) if total_properties > 0 else 0
-                self.progress_updated.emit(progress)
+            if matches:
+                found_count += 1
                 
-                id_item = self.find_child_by_text(property_item, 'id')
-                if not id_item:
-                    continue
-                    
-                property_id = id_item.text(1)
-                desc_item = self.find_child_by_text(property_item, 'desc')
-                if not desc_item:
-                    continue
-                    
-                en_item = self.find_child_by_text(desc_item, 'en')
-                if not en_item:
-                    continue
-                    
-                raw_description = en_item.text(1) or ""
+                email_count += stats.get('email', 0)
+                phone_count += stats.get('phone', 0)
+                keyword_count += stats.get('keyword', 0)
                 
-                matches_info = self.find_phone_matches(raw_description)
-                matches = matches_info['matches']
-                stats = matches_info['stats']
+                item_data = {
+                    'id': property_id,
+                    'full_text': raw_description,
+                    'original_text': raw_description,
+                    'desc_item': store.field_node(row, 'desc/en'),
+                    'stats': stats,
+                    'state': 'none',
+                    'has_email': stats.get('email', 0) > 0,
+                    'has_phone': stats.get('phone', 0) > 0,
+                    'has_keyword': stats.get('keyword', 0) > 0
+                }
+                self.found_items.append(item_data)
                 
-                if matches:
-                    found_count += 1
-                    
-                    email_count += stats.get('email', 0)
-                    phone_count += stats.get('phone', 0)
-                    keyword_count += stats.get('keyword', 0)
-                    
-                    item_data = {
-                        'id': property_id,
-                        'full_text': raw_description,
-                        'original_text': raw_description,
-                        'desc_item': en_item,
-                        'stats': stats,
-                        'state': 'none',
-                        'has_email': stats.get('email', 0) > 0,
-                        'has_phone': stats.get('phone', 0) > 0,
-                        'has_keyword': stats.get('keyword', 0) > 0
-                    }
-                    self.found_items.append(item_data)
-                    
-                    item_text = f"ID: {property_id} - {len(matches)} matches"
-                    
-                    type_indicators = []
-                    if stats.get('email', 0) > 0:
-                        type_indicators.append(f"{stats['email']} email")
-                    if stats.get('phone', 0) > 0:
-                        type_indicators.append(f"{stats['phone']} phone")
-                    if stats.get('keyword', 0) > 0:
-                        type_indicators.append(f"{stats['keyword']} keyword")
-                    
-                    if type_indicators:
-                        item_text += f" ({', '.join(type_indicators)})"
-                    
-                    item = QListWidgetItem(item_text)
-                    item.setData(Qt.UserRole, len(self.found_items) - 1)
-                    self.id_list.addItem(item)
-        
+                item_text = f"ID: {property_id} - {len(matches)} matches"
+                
+                type_indicators = []
+                if stats.get('email', 0) > 0:
+                    type_indicators.append(f"{stats['email']} email")
+                if stats.get('phone', 0) > 0:
+                    type_indicators.append(f"{stats['phone']} phone")
+                if stats.get('keyword', 0) > 0:
+                    type_indicators.append(f"{stats['keyword']} keyword")
+                
+                if type_indicators:
+                    item_text += f" ({', '.join(type_indicators)})"
+                
+                item = QListWidgetItem(item_text)
+                item.setData(Qt.UserRole, len(self.found_items) - 1)
+                self.id_list.addItem(item)
+    
+        progress.finish()
         self.update_item_colors()
         
         stats_text = f"Found: {found_count} objects"
@@ -609,7 +605,8 @@ class TabFindPhones(QWidget):
         new_text = self.text_edit.toPlainText()
         
         try:
-            item_data['desc_item'].setText(1, new_text)
+            with self.parent.tree.journal.step("Edit description"):
+                self.parent.tree.set_node_text(item_data['desc_item'], new_text)
             
             item_data['full_text'] = new_text
             item_data['original_text'] = new_text
@@ -655,12 +652,6 @@ class TabFindPhones(QWidget):
         
         self.update_item_colors()
             
-    def find_child_by_text(self, parent_item, text):
-        for i in range(parent_item.childCount()):
-            child = parent_item.child(i)
-            if child.text(0) == text:
-                return child
-        return None
         
     def copy_ids(self):
         if not self.found_items:
@@ -4,6 +4,13 @@ from PySide6.QtWidgets import QWidget, QVBoxLayout, QLabel, QListWidget, QFormLa
     QPushButton, QFileDialog, QMessageBox
 from PySide6.QtCore import Qt
 
+from action_preview import preview_actions
+from condition_expression import compile_expression
+from property_store import CONDITIONS, EXPRESSION
+
+# Shown after every action in the list, with the number of properties it would change
+PREVIEW_VERBS = {"add_node_type": "adds to", "remove_node_by_condition": "removes", "modify_node_type": "modifies"}
+
 
 class TabGroupActions(QWidget):
     def __init__(self, parent=None):
@@ -17,6 +24,10 @@ class TabGroupActions(QWidget):
         self.actions_list = QListWidget()
         layout.addWidget(self.actions_list)
 
+        # Dry run of the list on the open document, updated whenever the list changes
+        self.preview_label = QLabel()
+        layout.addWidget(self.preview_label)
+
         # Form for action configuration
         self.form_layout = QFormLayout()
         layout.addLayout(self.form_layout)
@@ -38,7 +49,8 @@ class TabGroupActions(QWidget):
         self.form_layout.addRow("Child node:", self.child_node)
 
         self.condition = QComboBox()
-        self.condition.addItems(["", "equal", "contains", "does not contain"])
+        self.condition.addItems(list(CONDITIONS))
+        self.condition.currentTextChanged.connect(self.on_condition_changed)
         self.form_layout.addRow("Value comparison condition:", self.condition)
 
         self.node_value = QLineEdit()
@@ -149,16 +161,40 @@ class TabGroupActions(QWidget):
                 QMessageBox.critical(self, "Error", f"An error occurred while loading data: {e}")
 
     def update_list_view(self):
+        hits, survivors, status = self.preview()
         self.actions_list.clear()
-        for item in self.actions:
-            self.actions_list.addItem(
-                f"{item["action"]} Parent: {item["parent"]}, Child: {item["child"]}, Value: {item["value"]}, Condition: {item["condition"]}, New value: {item["new_value"]}")
+        for item, hit in zip(self.actions, hits):
+            text = f"{item["action"]} Parent: {item["parent"]}, Child: {item["child"]}, Value: {item["value"]}, Condition: {item["condition"]}, New value: {item["new_value"]}"
+            if hit is not None:
+                text += f"  →  {PREVIEW_VERBS[item["action"]]} {hit}"
+            self.actions_list.addItem(text)
+        self.preview_label.setText(status)
+
+    def preview(self):
+        # (hits per action, surviving properties, text for the preview label)
+        hits = [None] * len(self.actions)
+        tree = self.parent.tree
+        if not self.actions or not tree.has_document() or tree.xml_model.is_bulk_update():
+            return hits, None, ""
+        try:
+            hits, survivors = preview_actions(tree.document, self.actions)
+        except ValueError as e:
+            # e.g. a numeric condition with a value that is not a number
+            return hits, None, f"Preview not available: {e}"
+        total = self.parent.state.get_property_count()
+        return hits, survivors, f"Preview: {survivors} of {total} properties remain"
 
     def on_action_select_index_changed(self, index):
         # Get the text of the selected item
         if self.action_select.currentIndex() != 0:
             self.child_node.setPlaceholderText("Enter child node name")
 
+    def on_condition_changed(self, condition):
+        if condition == EXPRESSION:
+            self.node_value.setPlaceholderText('e.g. type in ["Villa", "Apartment"] and price >= 100000')
+        else:
+            self.node_value.setPlaceholderText("Enter value")
+
         # METHODS
     def add_action_to_list(self):
         action = self.action_select.currentText()
@@ -168,6 +204,13 @@ class TabGroupActions(QWidget):
         condition = self.condition.currentText()
         new_value = self.new_value.text()
 
+        if condition == EXPRESSION:
+            try:
+                compile_expression(node_value)
+            except ValueError as e:
+                QMessageBox.critical(self, "Error", str(e))
+                return
+
         action_item = {
             "action": action,
             "parent": parent_node,
@@ -178,9 +221,7 @@ class TabGroupActions(QWidget):
         }
 
         self.actions.append(action_item)
-        self.actions_list.addItem(
-            f"{action.capitalize()} Parent: {parent_node}, Child: {child_node}, Value: {node_value}, Condition: {condition}, New value: {new_value}")
-        #
+        self.update_list_view()
 
     def remove_action_from_list(self):
         selected_items = self.actions_list.selectedItems()
@@ -188,6 +229,8 @@ class TabGroupActions(QWidget):
             index = self.actions_list.row(item)
             self.actions.pop(index)
             self.actions_list.takeItem(index)
+        if selected_items:
+            self.update_list_view()
 
     def execute_actions(self):
         if len(self.actions) > 0:
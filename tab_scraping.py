@@ -1,13 +1,13 @@
 import json
 from typing import Callable
 
-import requests
 from PySide6.QtCore import Signal
 from PySide6.QtGui import QStandardItemModel, QStandardItem
-from bs4 import BeautifulSoup
 from datetime import datetime
 import os
-import time
+
+from http_cache import HttpCache
+from page_scraper import PageScraper, parse_scrap_item
 
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QLabel, QLineEdit, QPushButton, QListView,
                                 QHBoxLayout, QMessageBox, QFileDialog)
@@ -183,92 +183,44 @@ class TabScraping(QWidget):
             index = selected_indexes[0]
             self.scrap_list_model.removeRow(index.row())
 
-    def begin_scraping(self, progress_callback):
+    def begin_scraping(self, progress):
         if self.scrap_list_model.rowCount() > 0:
             not_found_pages = []
-            data_to_scrape = [self.scrap_list_model.item(i).text() for i in range(self.scrap_list_model.rowCount())]
-            root = self.parent.tree.topLevelItem(0)  # Root item
-            total_items = self.parent.state.get_property_count()
-            # Process the XML tree from the main window
-            for i in range(root.childCount()):
-                if root.child(i).text(0) == 'property':
-                    property_node = root.child(i)
-                    message = str(property_node.child(0).text(1))
-                    self.begin_scraping_property.emit(message)
-
-                    self.parent.state.current_property_node = root.child(i)
-                    property_id = self.parent.state.current_property_node.child(0).text(1)
-
-                    # property_id = property_node.text(0)  # Assuming ID is in the first column
-
-                    # Prepare the URL and request the page
-                    url = f'https://lextrusrealestate.com/property-{property_id}/'
-                    try:
-                        response = requests.get(url)
-                        response.raise_for_status()
-                    except requests.exceptions.RequestException:
-                        not_found_pages.append(property_id)
-                        continue
-
-                    # Scraping with BeautifulSoup
-                    soup = BeautifulSoup(response.text, 'html.parser')
-
-                    body = soup.find('body')
-                    property_details_div = body.find('div', id='estatebud-property-details')
-
-                    if property_details_div:
-
-                        scraped_data = {'ID': property_id, }
-
-                        for item_str in data_to_scrape:
-                            item = eval(item_str)  # Convert the string back to a dictionary
-                            elements = soup.find_all(item['param_tag_type'], class_=item['param_tag_class'])
-                            item_dict = {}
-
-                            for element in elements:
-                                name = element.select_one(item['path_to_param_name'])
-
-                                if ':' in element.get_text():
-                                    cleaned_name = name.get_text(strip=True).rstrip(':') if name else None
-                                elif ',' in element.get_text():
-                                    cleaned_name = name.get_text(strip=True).rstrip(',') if name else None
-                                else:
-                                    cleaned_name = name.get_text(strip=True)
-
-                                value = ""
-
-                                if ':' in element.get_text():
-                                    value = element.get_text().split(':')[-1].strip()
-                                elif ',' in element.get_text():
-                                    value = element.get_text().split(',')[-1].strip()
-                                else:
-                                    pass
-
-                                if cleaned_name:
-                                    item_dict[cleaned_name] = value
-
-                            if item_dict:
-                                dict_name = item['dict_name']
-                                scraped_data[dict_name] = item_dict
-
-                            progress_callback(int((i + 1) / total_items * 100))
-                            time.sleep(0.05)  # Delay before the next request
-
-                        if scraped_data:
-                            data_string = json.dumps(scraped_data)
-                            self.data_scraped.emit(data_string)
-
-
-                    else:
-                        not_found_pages.append(property_id)
-
-                # progress_callback(int((i + 1) / total_items * 100))
+            scrap_items = [parse_scrap_item(self.scrap_list_model.item(i).text())
+                           for i in range(self.scrap_list_model.rowCount())]
+            # <id> of every property in document order, properties without one can't be scraped
+            property_ids = [property_id for property_id in self.parent.tree.document.store.ids()
+                            if property_id is not None]
+            progress.start_stage("Scraping", len(property_ids))
+
+            # Pages are fetched concurrently, results come back in property order.
+            # Pages fetched before are only downloaded again when they changed
+            cache = HttpCache(max_size_mb=self.parent.http_cache_max_size_mb) \
+                if self.parent.http_cache_max_size_mb > 0 else None
+            scraper = PageScraper(scrap_items, self.parent.scraping_url, self.parent.scraping_concurrency,
+                                  self.parent.scraping_pool_size, cache=cache)
+            for item, error in scraper.skipped_items:
+                print(f"Scraping list item {item} skipped: {error}")
+            for property_id, scraped_groups in scraper.scrape(property_ids):
+                self.begin_scraping_property.emit(str(property_id))
+
+                if scraped_groups is None:
+                    not_found_pages.append(property_id)
+                else:
+                    scraped_data = {'ID': property_id, **scraped_groups}
+                    data_string = json.dumps(scraped_data)
+                    self.data_scraped.emit(data_string)
+
+                progress.advance()
+
+            if cache is not None:
+                print(cache.summary())
 
             # Handle not found pages
-            self.parent.state.current_property_node = None
             if not_found_pages:
                 self.save_not_found_pages(not_found_pages)
-            
+            progress.finish()
+
             self.scraping_finished.emit()
 
             # QMessageBox.information(self, "Scraping Completed", "Scraping process is finished!")
@@ -0,0 +1,124 @@
+"""
+PageScraper against a stand-in site on localhost. Run from the repository root:
+
+    python -m unittest discover -s tests
+"""
+import random
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from page_scraper import PageScraper
+
+SCRAP_ITEMS = [
+    {'param_tag_type': 'div', 'param_tag_class': 'estatebud-property-info', 'path_to_param_name': 'b',
+     'dict_name': 'info'},
+    {'param_tag_type': 'li', 'param_tag_class': 'estatebud-facility', 'path_to_param_name': 'b',
+     'dict_name': 'facilities'},
+]
+
+
+def property_page(property_id):
+    facilities = "".join(f'<li class="estatebud-facility"><b>Facility {i}</b></li>' for i in range(property_id % 3))
+    return f"""<html><body>
+<div id="header"><div class="estatebud-property-info"><b>Outside:</b> ignored</div></div>
+<div id="estatebud-property-details">
+<div class="estatebud-property-info"><b>Bedrooms:</b> {property_id % 4}</div>
+<div class="estatebud-property-info"><b>Area, m2</b>, {property_id}</div>
+<ul>{facilities}</ul>
+</div></body></html>"""
+
+
+def expected_groups(property_id):
+    groups = {'info': {'Bedrooms': str(property_id % 4), 'Area, m2': str(property_id)}}
+    if property_id % 3:
+        groups['facilities'] = {f'Facility {i}': '' for i in range(property_id % 3)}
+    return groups
+
+
+class StandInSite(BaseHTTPRequestHandler):
+    """Property pages at /property-<id>/, IDs divisible by 7 are missing (404)."""
+    protocol_version = "HTTP/1.1"  # Keep-alive, so connections can be counted
+    disable_nagle_algorithm = True
+    lock = threading.Lock()
+    connections = 0
+    requests = 0
+
+    def setup(self):
+        super().setup()
+        with self.lock:
+            StandInSite.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        with self.lock:
+            StandInSite.requests += 1
+        property_id = int(self.path.strip("/").split("-")[1])
+        # Pages arrive out of order
+        time.sleep(random.uniform(0.0, 0.02))
+        if property_id % 7 == 0:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = property_page(property_id).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class PageScraperTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInSite)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/property-{{property_id}}/"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StandInSite.connections = 0
+        StandInSite.requests = 0
+
+    def test_results_in_property_order(self):
+        property_ids = [str(property_id) for property_id in range(100, 160)]
+        scraper = PageScraper(SCRAP_ITEMS, self.url, concurrency=8, pool_size=8)
+        results = list(scraper.scrape(property_ids))
+
+        self.assertEqual([property_id for property_id, _ in results], property_ids)
+        for property_id, groups in results:
+            if int(property_id) % 7:
+                self.assertEqual(groups, expected_groups(int(property_id)))
+
+    def test_failing_pages_give_none(self):
+        scraper = PageScraper(SCRAP_ITEMS, self.url, concurrency=4, pool_size=4)
+        results = dict(scraper.scrape(["7", "8", "14"]))
+        self.assertEqual(results, {"7": None, "8": expected_groups(8), "14": None})
+
+        # Nothing listens on port 9 (discard), the connection is refused
+        unreachable = PageScraper(SCRAP_ITEMS, "http://127.0.0.1:9/property-{property_id}/", timeout=2)
+        self.assertEqual(list(unreachable.scrape(["1", "2"])), [("1", None), ("2", None)])
+
+    def test_connections_are_pooled(self):
+        property_ids = [str(property_id) for property_id in range(1, 81)]
+        scraper = PageScraper(SCRAP_ITEMS, self.url, concurrency=8, pool_size=3)
+        results = list(scraper.scrape(property_ids))
+
+        self.assertEqual(len(results), len(property_ids))
+        self.assertEqual(StandInSite.requests, len(property_ids))
+        # Every request went over one of the pool's keep-alive connections
+        self.assertLessEqual(StandInSite.connections, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,26 +1,63 @@
-import json
+import os
 import re
 import time
 import urllib
 
 import requests
 from PySide6 import QtCore
-from lxml import etree
+from PySide6.QtCore import QThread, Signal, Slot
 
-from PySide6.QtGui import Qt, QAction
-from PySide6.QtWidgets import QTreeWidget, QTreeWidgetItem, QMenu, QInputDialog, QMessageBox
+from PySide6.QtGui import QAction
+from PySide6.QtWidgets import QTreeView, QMenu, QInputDialog, QMessageBox, QApplication, QAbstractItemView
 
+from action_plan import element_filter
+from edit_journal import EditJournal
+from feed_snapshot import file_digest, load_snapshot, write_snapshot, evict_snapshots
+from json_stream import NdjsonReader, write_json, write_ndjson
+from property_store import price_updates
+from xml_document import XmlDocument, XmlNode, node_from_element
+from xml_stream import FeedReader
+from xml_tree_model import XmlTreeModel
+from xml_writer import write_xml
 
 
-class TreeWidget(QTreeWidget):
+class SnapshotWriter(QThread):
+    # Writes the snapshot of a freshly parsed feed, the window can be used meanwhile
+    written = Signal(object)
+
+    def __init__(self, root, xml_file, digest, changes):
+        super().__init__()
+        self.root = root
+        self.xml_file = xml_file
+        self.digest = digest
+        self.changes = changes  # document.changes when the writer was started
+        self.paths = None  # (temporary path, snapshot path) once the file is written
+        self.error = None
+
+    def run(self):
+        try:
+            self.paths = write_snapshot(self.root, self.xml_file, self.digest)
+        except OSError as e:
+            self.error = e
+        self.written.emit(self)
+
+
+class TreeWidget(QTreeView):
     def __init__(self, parent=None):
         super().__init__()
         self.parent = parent
-        self.setHeaderLabels(["Tag", "Value"])
+        # Every change of the document is recorded for undo/redo
+        self.journal = EditJournal()
+        self.document = XmlDocument(self.journal)
+        self.xml_model = XmlTreeModel(self.document, self)
+        self.setModel(self.xml_model)
+        self.snapshot_writers = []  # Running SnapshotWriters, kept until they are finished
+        self.setUniformRowHeights(True)
         self.setColumnWidth(0, 200)
         self.setColumnWidth(1, 150)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
 
-        self.itemDoubleClicked.connect(self.edit_item)
+        self.doubleClicked.connect(self.edit_index)
 
         # Connect the context menu event
         self.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)  # Qt.CustomContextMenu
@@ -46,17 +83,16 @@ class TreeWidget(QTreeWidget):
         menu.exec(self.viewport().mapToGlobal(pos))
 
     def add_sub_item(self):
-        # Get the currently selected item
-        selected_item = self.currentItem()
-        if selected_item:
+        # Get the currently selected node
+        selected_node = self.current_node()
+        if selected_node:
             # Prompt the user for the new sub-item name
             text, ok = QInputDialog.getText(self, "Add Subnode", "Enter new subnode name (only lowercase letters, numbers and _):")
             if ok and text:
                 # Validate the input
                 if self.validate_name(text):
-                    # Create and add the new sub-item
-                    new_sub_item = QTreeWidgetItem(selected_item, [text])
-                    selected_item.addChild(new_sub_item)
+                    # Create and add the new sub-node
+                    self.append_node(selected_node, text)
                 else:
                     # Show an error message if validation fails
                     QMessageBox.warning(self, "Invalid Name",
@@ -67,86 +103,257 @@ class TreeWidget(QTreeWidget):
     def validate_name(self, name):
         return re.match(r'^[a-z][a-z0-9_]*$', name) is not None
 
+# MODEL ACCESS
+    def current_node(self):
+        return self.xml_model.node_from_index(self.currentIndex())
 
-    def remove_selected_item(self):
-        # Get the currently selected item
-        selected_item = self.currentItem()
-        if selected_item:
-            # Remove the selected item
-            index = self.indexOfTopLevelItem(selected_item)
-            if index != -1:
-                self.takeTopLevelItem(index)
+    def selected_node(self):
+        indexes = self.selectionModel().selectedIndexes()
+        if not indexes:
+            return None
+        return self.xml_model.node_from_index(indexes[0])
+
+    def has_document(self):
+        return not self.document.is_empty()
+
+    def append_node(self, parent_node, tag, text=""):
+        return self.xml_model.insert_node(parent_node, XmlNode(tag, text or ""))
+
+    def remove_node(self, node):
+        self.xml_model.remove_node(node)
+
+    def remove_nodes(self, nodes):
+        if self.xml_model.is_bulk_update():
+            self.xml_model.remove_nodes(nodes)
+            return
+        # The view is repainted once after all nodes are gone
+        self.setUpdatesEnabled(False)
+        try:
+            self.xml_model.remove_nodes(nodes)
+        finally:
+            self.setUpdatesEnabled(True)
+        self.expand(self.xml_model.index(0, 0))
+
+    def set_node_text(self, node, text):
+        self.xml_model.set_node_text(node, text)
+
+    def restore_nodes(self, entries):
+        self.xml_model.restore_nodes(entries)
+
+    def undo(self):
+        # Returns the name of the undone step, or None if there was nothing to undo
+        if not self.journal.can_undo():
+            return None
+        return self.replay(self.journal.undo, self.journal.next_undo_size())
+
+    def redo(self):
+        if not self.journal.can_redo():
+            return None
+        return self.replay(self.journal.redo, self.journal.next_redo_size())
+
+    def replay(self, method, size):
+        # Large steps are replayed with the view detached and refreshed once
+        bulk = size > self.xml_model.ROW_UPDATE_LIMIT
+        if bulk:
+            self.begin_bulk_update()
+        try:
+            name = method(self)
+        finally:
+            if bulk:
+                self.end_bulk_update()
+        self.parent.state.set_property_count(self.count_properties())
+        return name
+
+    # Reads used by ActionPlan, a PlanningEditor answers them with its pending changes
+    def find_child(self, node, tag):
+        return node.find_child(tag)
+
+    def find_path(self, node, path):
+        return node.find_path(path)
+
+    def node_text(self, node):
+        return node.text
+
+    def node_children(self, node):
+        return node.children
+
+    def begin_bulk_update(self):
+        # Used while a worker changes the document, the view is refreshed once at the end
+        self.setUpdatesEnabled(False)
+        self.setEnabled(False)
+        self.xml_model.begin_bulk_update()
+
+    def end_bulk_update(self):
+        if not self.xml_model.is_bulk_update():
+            return
+        self.xml_model.end_bulk_update()
+        self.setEnabled(True)
+        self.setUpdatesEnabled(True)
+        self.expand(self.xml_model.index(0, 0))
+        self.parent.state.set_property_count(self.count_properties())
+
+    @Slot(object)
+    def apply_changes(self, changes):
+        # ChangePlan computed on a worker thread, applied with a single view refresh
+        self.begin_bulk_update()
+        try:
+            with self.journal.step("Group actions"):
+                changes.apply(self)
+        finally:
+            self.end_bulk_update()
+
+    def clear(self):
+        self.document.clear()
+        self.xml_model.reset()
+        self.parent.state.set_property_count(0)
 
 # LOADING XML
-    def load_xml(self, xml_file):
+    def load_xml(self, xml_file, removal_actions=None):
+        """
+        Load a feed. removal_actions (remove_node_by_condition items) are applied
+        while parsing, the properties they remove are never added to the document.
+        Returns the number of removed properties.
+        """
         self.clear()
 
-        tree = etree.parse(xml_file)
-        root = tree.getroot()
+        if removal_actions:
+            # The snapshot holds the whole feed, so a filtered load always parses
+            reader = FeedReader(xml_file, keep=element_filter(removal_actions))
+            self.parse_batches(reader, node_from_element, "Loading XML...")
+            self.collapseAll()
+            self.expand(self.xml_model.index(0, 0))
+            self.parent.state.set_property_count(self.count_properties())
+            return reader.skipped
+
+        # A feed that was opened before is read back from its binary snapshot,
+        # which skips XML parsing completely. The snapshot is found by the hash of
+        # the file content, so a changed or re-downloaded feed is parsed again.
+        try:
+            digest = file_digest(xml_file)
+            root = load_snapshot(xml_file, digest)
+        except (OSError, ValueError, UnicodeDecodeError, IndexError):
+            digest, root = None, None
+
+        if root is not None:
+            self.document.set_root_node(root)
+            self.xml_model.reset()
+        else:
+            self.parse_xml(xml_file)
+            self.save_snapshot(xml_file, digest)
 
-        self.add_elements_to_tree(self.invisibleRootItem(), root)
-        self.expandItem(self.invisibleRootItem())
         self.collapseAll()
+        self.expand(self.xml_model.index(0, 0))
         self.parent.state.set_property_count(self.count_properties())
+        return 0
 
-    def add_elements_to_tree(self, parent_item, element):
-        # Create a QTreeWidgetItem for the current XML element
-        item = QTreeWidgetItem(parent_item, [element.tag, element.text.strip() if element.text else ""])
+    def load_ndjson(self, json_file):
+        self.clear()
+        self.parse_batches(NdjsonReader(json_file), lambda node, root: root.append(node), "Loading NDJSON...")
+        self.collapseAll()
+        self.expand(self.xml_model.index(0, 0))
+        self.parent.state.set_property_count(self.count_properties())
 
-        # Add attributes as child nodes
-        for attr_name, attr_value in element.attrib.items():
-            QTreeWidgetItem(item, [f"{element.tag}{attr_name}", attr_value])
+    def parse_xml(self, xml_file):
+        # Properties are parsed one at a time and added to the document in batches,
+        # so the window stays responsive and only one copy of the feed is in memory.
+        # The view creates rows only for the nodes it shows.
+        self.parse_batches(FeedReader(xml_file), node_from_element, "Loading XML...")
 
-        # Add child elements
-        for child in element:
-            self.add_elements_to_tree(item, child)
+    def parse_batches(self, reader, add_item, message):
+        root = None
+        self.parent.status_bar.start_progress()
+        self.parent.status_bar.show_message(message)
+
+        try:
+            for batch in reader.batches():
+                if root is None:
+                    root = self.document.set_root(reader.root_tag, reader.root_attrib)
+
+                for item in batch:
+                    add_item(item, root)
+
+                self.parent.status_bar.progress_bar.setValue(reader.progress)
+                QApplication.processEvents(QtCore.QEventLoop.ExcludeUserInputEvents)
+
+            if root is None:
+                root = self.document.set_root(reader.root_tag, reader.root_attrib)
+            root.text = reader.root_text
+            self.document.reindex()
+        finally:
+            self.xml_model.reset()
+            self.parent.status_bar.stop_progress()
+
+    def save_snapshot(self, xml_file, digest):
+        # Walking millions of nodes takes seconds, so the file is written on another thread
+        if digest is None or self.document.is_empty():
+            return
+        writer = SnapshotWriter(self.document.root, xml_file, digest, self.document.changes)
+        writer.written.connect(self.snapshot_written)
+        self.snapshot_writers.append(writer)
+        writer.start()
+
+    def snapshot_written(self, writer):
+        writer.wait()  # run() returns right after the signal
+        self.snapshot_writers.remove(writer)
+        if writer.paths is None:
+            # The snapshot is only a cache, the feed is loaded anyway
+            print(f"Snapshot was not saved: {writer.error}")
+            return
+        temp_path, path = writer.paths
+        try:
+            if self.document.changes != writer.changes:
+                # Edited (or another file loaded) while it was written, the file may hold a mix
+                os.remove(temp_path)
+                return
+            os.replace(temp_path, path)
+            evict_snapshots(os.path.dirname(path), self.parent.snapshot_max_age_days, self.parent.snapshot_max_size_mb)
+        except OSError as e:
+            print(f"Snapshot was not saved: {e}")
 
     def add_single_node(self, parent, new_node):
-        QTreeWidgetItem(parent, [new_node['tag'], new_node['text']])
+        self.append_node(parent, new_node['tag'], new_node['text'])
 
 # COUNT PROPERTIES
     def count_properties(self):
-        return self.count_nodes_with_name("property") or 0
+        return len(self.document.store)
 
     def count_nodes_with_name(self, name):
-        count = 0
-        # Iterate through all top-level items
-        for i in range(self.topLevelItemCount()):
-            top_level_item = self.topLevelItem(i)
-            # Iterate through children of the top-level item
-            for j in range(top_level_item.childCount()):
-                child_item = top_level_item.child(j)
-                if child_item.text(0) == name:
-                    count += 1
-        return count
+        if self.document.is_empty():
+            return 0
+        # Count children of the root node with the given name
+        return sum(1 for child in self.document.root.children if child.tag == name)
 
     def toggle_second_level_visibility(self):
+        root_index = self.xml_model.index(0, 0)
+        if not root_index.isValid():
+            return
+        # Second-level rows are created lazily, expose all of them first
+        self.xml_model.fetch_all(root_index)
+
         # Determine the current state of second-level items
         any_expanded = False
-        for index in range(self.topLevelItemCount()):
-            top_level_item = self.topLevelItem(index)
-            for child_index in range(top_level_item.childCount()):
-                second_level_item = top_level_item.child(child_index)
-                if second_level_item.isExpanded():
-                    any_expanded = True
-                    break
-            if any_expanded:
+        row_count = self.xml_model.rowCount(root_index)
+        for row in range(row_count):
+            if self.isExpanded(self.xml_model.index(row, 0, root_index)):
+                any_expanded = True
                 break
 
         # Toggle the state based on the current state
-        for index in range(self.topLevelItemCount()):
-            top_level_item = self.topLevelItem(index)
-            for child_index in range(top_level_item.childCount()):
-                second_level_item = top_level_item.child(child_index)
-                second_level_item.setExpanded(not any_expanded)  # Toggle state
+        self.setUpdatesEnabled(False)
+        for row in range(row_count):
+            self.setExpanded(self.xml_model.index(row, 0, root_index), not any_expanded)  # Toggle state
+        self.setUpdatesEnabled(True)
 
 
 # EDIT ITEM
-    def edit_item(self, item, column):
-        if column == 1:  # and self.current_editor_item == None:
-            item.setFlags(Qt.ItemFlag.ItemIsEditable | Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable)
-            self.editItem(item, column)
-            # self.current_editor_item = item
+    def edit_index(self, index):
+        if index.column() == 1:
+            self.edit(index)
+
+    def edit_node_value(self, node):
+        index = self.xml_model.index_from_node(node, column=1)
+        if index.isValid():
+            self.edit(index)
 
 
     def delete_selected_node_type(self):
@@ -154,90 +361,23 @@ class TreeWidget(QTreeWidget):
 
 #OPERATIONS
 
-    # @staticmethod
-    # def check_condition(condition, child_value, node_value):
-    #     match condition:
-    #         case "":
-    #             return True
-    #         case "equal":
-    #             return node_value == child_value
-    #         case "contains":
-    #             return child_value in node_value
-    #         case "does not contain":
-    #             return child_value not in node_value
-
-    def add_node_type(self, update_progress_callback, action_item):
-        root = self.topLevelItem(0)
-        # action_item = kwargs.get('action')
-        parent_node_type = action_item["parent"]
-        new_node_type = action_item["child"]
-        initial_value = action_item["value"]
-        total_items = self.parent.state.get_property_count()
-
-        # # counter initial value takes current progress bar value in case it is not the first action
-        # counter = self.parent.status_bar.progress_bar.value()
-        for i in range(root.childCount()):
-            item = root.child(i)
-            if item.text(0) == parent_node_type:
-                QTreeWidgetItem(item, [new_node_type, initial_value])
-            print(f"Updating progress bar: {(int((i + 1) / total_items * 100))})")
-            update_progress_callback(int((i + 1) / total_items * 100))
-
     def remove_selected_item(self):
-        # Get the currently selected item
-        selected_items = self.selectedItems()
-        if not selected_items:
+        # Get the currently selected node
+        node_to_remove = self.selected_node()
+        if node_to_remove is None:
             return  # No item selected
 
-        # Assume we are only dealing with a single selected item for simplicity
-        item_to_remove = selected_items[0]
-
-        # Remove the item and all its children
-        self.remove_item(item_to_remove)
+        # Remove the node and all its children
+        self.remove_item(node_to_remove)
         self.parent.state.set_property_count(self.count_properties())
 
-    def remove_item(self, item: QTreeWidgetItem):
+    def remove_item(self, item: XmlNode):
         if not item:
             return
 
-        # Check if the item is a top-level item or a child item
-        parent = item.parent()
-        if parent:
-            # Remove the item from its parent
-            parent.removeChild(item)
-        else:
-            # Remove the item from the tree (it's a top-level item)
-            index = self.indexOfTopLevelItem(item)
-            if index != -1:
-                self.takeTopLevelItem(index)
-
-        # Optionally, you can also delete the item to free memory
-        del item
-
-
-    def remove_node_by_condition(self, update_progress_callback, action_item):
-        root = self.topLevelItem(0)
-        parent = action_item['parent']
-        child = action_item['child']
-        child_value = action_item['value']
-        condition = action_item['condition']
-
-        nodes_to_remove = []
-
-        for i in range(root.childCount()):
-            update_progress_callback(int((i + 1) / root.childCount() * 100))
-            if root.child(i).text(0) == parent:
-                node_to_remove = root.child(i)
-                if self.check_children_for_condition(node_to_remove, child, condition, child_value):
-                    nodes_to_remove.append(node_to_remove)
+        # Remove the node from its parent (removing the root node clears the document)
+        self.remove_node(item)
 
-            else:
-                pass
-
-        for node in nodes_to_remove:
-            self.remove_item(node)
-
-        self.parent.state.set_property_count(self.count_properties())
 
     def compare_db_media_links_to_tree(self, update_progress_callback, action_item=None):
         url = 'https://aparteu.com/api/v1/get-info/'
@@ -257,7 +397,7 @@ class TreeWidget(QTreeWidget):
 
 
     def iterate_over_media_links(self, data):
-        if self.topLevelItemCount() > 0:
+        if self.has_document():
             links_db = data
             if len(links_db) > 0:
 
@@ -295,38 +435,26 @@ class TreeWidget(QTreeWidget):
             QMessageBox.critical(None, "Error", "Load XML file first.")
 
     def get_ids_and_media_links(self):
-        root_item = self.topLevelItem(0)
+        store = self.document.store
+        ids = store.column('id')
+        images = store.column(store.IMAGES)
         tree_link_list = []
 
-        for i in range(root_item.childCount()):
-            property_item = root_item.child(i)
+        for row in store.rows():
+            id = ids[row]
+            # print("ID: " + str(id))
+            links = []
 
-            if property_item.text(0) == 'property':
-                id = property_item.child(0).text(1)
-                # print("ID: " + str(id))
-                links = []
-
-                images_node = self.get_child_by_name(property_item, 'images')
-                # print("Image_node: " + str(images_node))
-
-                if images_node:  # Check if images_node is not None
-                    # print("Image_node count: " + str(images_node.childCount()))
-
-                    for index in range(images_node.childCount()):
-                        image = images_node.child(index)
-
-                        link = self.get_child_by_name(image, 'url')  # Fix indentation here
-                        if link is not None:
-                            cleaned_link = self.remove_link_suffix(link.text(1))
-                            links.append(cleaned_link)  # Make sure to call text() to get the URL string
-                else:
-                    print("No images node found for property: " + str(id))
+            if images[row] is not None:  # Check if the property has an images node
+                links = [self.remove_link_suffix(link) for link in images[row]]
+            else:
+                print("No images node found for property: " + str(id))
 
-                tree_item = {
-                    "id": id,
-                    "links": links
-                }
-                tree_link_list.append(tree_item)
+            tree_item = {
+                "id": id,
+                "links": links
+            }
+            tree_link_list.append(tree_item)
 
         return tree_link_list
 
@@ -336,155 +464,40 @@ class TreeWidget(QTreeWidget):
             return link_url[:-len(suffix)]
         return link_url
 
-    def check_children_for_condition(self, item: QTreeWidgetItem, child_name: str, condition: str, val: str) -> bool:
-        # print('############## Enterng: check_children_for_condition ###############')
-        # print("Item: " + item.text(0))
-        # print("Child: " + child_name)
-        # print("Condition: " + condition)
-        # print("Val: " + val)
-
-        # Iterate over the children of the current item
-        for i in range(item.childCount()):
-            # print(f'Enterng for loop {i} with total count {item.childCount()} in check_children_for_condition')
-            child = item.child(i)
-            # print("Child: " + item.child(i).text(0))
-
-            # Recursively check children
-            if child.childCount() > 0:
-                # print("Child has children: " + str(child.childCount()))
-                if self.check_children_for_condition(child, child_name, condition, val):
-                    # print("--- For Child returned true: " + str(child.text(0)))
-                    return True
-
-            # Check if the child has the specified name
-            if child.text(0) == child_name:
-                child_value = child.text(1)
-                # print("Child value: " + child_value)
-                if condition == 'equal':
-                    # print("??? Compare child value: " + child_value + " and " + val)
-                    if child_value == val:
-                        # print("+++ Success: they are equal")
-                        return True
-                elif condition == 'contains':
-                    if val in child_value:
-                        return True
-                elif condition == 'does not contain':
-                    if val not in child_value:
-                        return True
-                else:
-                    raise ValueError(f"Unsupported condition: {condition}")
-
-        # Return False if no matching child is found
-        return False
-
-
-    def modify_node_type(self, progress_callback, action_item):
-        parent = action_item["parent"]
-        child = action_item["child"]
-        child_value = action_item["value"]
-        condition = action_item["condition"]
-        new_value = action_item["new_value"]
-        root = self.topLevelItem(0)
-        total_items = self.parent.state.get_property_count()
-        for i in range(root.childCount()):
-
-            item = root.child(i)
-            if item.text(0) == parent:
-                child_node_to_change = self.get_child_by_name(item, child)
-                if self.check_condition(condition, child_value, child_node_to_change.text(1)):
-                    child_node_to_change.setText(1, new_value)
-                else:
-                    pass
-            progress_callback(int((i + 1) / total_items * 100))
-
     def process_price_nodes(self):
-        root = self.invisibleRootItem()
-
-        def traverse(item, level):
+        with self.journal.step("Normalize prices"):
+            for price_node, price in price_updates(self.document.store):
+                self.set_node_text(price_node, price)
 
-            if level == 3 and item.text(0) == 'price' and item.text(1) != '':
-                try:
-                    value = int(float(item.text(1)))
-                    print(value)
-                    if value % 1000 != 0:
-                        value = ((value // 1000) + 1) * 1000
-                    item.setText(1, str(value))
-                except ValueError:
-                    pass
 
-            elif level < 3:
-                for i in range(item.childCount()):
-                    traverse(item.child(i), level + 1)
-
-        for i in range(root.childCount()):
-            traverse(root.child(i), 1)
-
-
-    def get_child_by_name(self, parent, name):
-        for i in range(parent.childCount()):
-            child = parent.child(i)
-            if child.text(0) == name:
-                return child
-        return None
 
     def save_as_xml(self, file_name):
         self.clean_description()
-        root_item = self.invisibleRootItem().child(0)
-        root = self.build_xml_element(root_item)
-        tree = etree.ElementTree(root)
-        tree.write(file_name)
-
-    def build_xml_element(self, item):
-        elem = etree.Element(item.text(0))
-        elem.text = item.text(1)
-        for i in range(item.childCount()):
-            child = item.child(i)
-            elem.append(self.build_xml_element(child))
-        return elem
-
-    def save_as_json(self, file_name):
-        root_item = self.invisibleRootItem().child(0)
-        root = self.build_json_dict(root_item)
-        with open(file_name, 'w') as json_file:
-            json.dump(root, json_file, indent=4)
-
-    def build_json_dict(self, item):
-        result = {"tag": item.text(0), "text": item.text(1), "children": []}
-        for i in range(item.childCount()):
-            child = item.child(i)
-            result["children"].append(self.build_json_dict(child))
-        return result
-
-    def clean_description(self):
-        root = self.topLevelItem(0)
-        for i in range(root.childCount()):
-            property_node = root.child(i)
+        write_xml(self.document.root, file_name)
 
-            desc_node = find_child_by_text(property_node, "desc")
-            if desc_node:
-                en_node = desc_node.child(0)
+    def save_as_json(self, file_name, compact=False):
+        write_json(self.document.root, file_name, compact)
 
-                if en_node and en_node.text(0) == 'en':
-                    original_text = en_node.text(1)
-                    lines = original_text.splitlines()
+    def save_as_ndjson(self, file_name):
+        write_ndjson(self.document.root, file_name)
 
-                    if lines:
-                        cleaned_first_line = clean_text(lines[0])
-                        lines[0] = cleaned_first_line
-
-                    updated_text = "\n".join(lines)
-                    en_node.setText(1, updated_text)
+    def clean_description(self):
+        updates = self.parent.description_cleaner.document_updates(self.document.store)
+        with self.journal.step("Clean descriptions"):
+            for desc_node, text in updates:
+                self.set_node_text(desc_node, text)
 
     def trim_tree(self, parent_item, number, position, action):
         """
-        Trims or preserves child items in the QTreeWidget based on the given number, position, and action.
+        Trims or preserves child nodes of the document based on the given number, position, and action.
 
-        :param parent_item: The parent QTreeWidgetItem (usually the root item).
+        :param parent_item: The parent XmlNode (usually the root node).
         :param number: The number of items to remove or preserve.
         :param position: Whether to trim from the 'start' or 'end'.
         :param action: Action to perform - 'remove' or 'preserve'.
         """
-        child_items = [parent_item.child(i) for i in range(parent_item.childCount())]
+        all_items = parent_item.children
+        child_items = list(all_items)
 
         if position == "start":
             # Remove from start or preserve from start
@@ -499,75 +512,25 @@ class TreeWidget(QTreeWidget):
             elif action == "preserve":
                 child_items = child_items[-number:]  # Preserve the last N items
 
-        # Clear current children and add the remaining child items
-        parent_item.takeChildren()
-        for item in child_items:
-            parent_item.addChild(item)
+        # Remove the other child items, the removed ones are kept for undo
+        kept = set(child_items)
+        with self.journal.step("Trim"):
+            self.remove_nodes([item for item in all_items if item not in kept])
 
         # Optionally, you could update the count of remaining properties, or any other UI elements
-        self.expandItem(parent_item)  # Expand the root item after modification
+        self.expand(self.xml_model.index_from_node(parent_item))  # Expand the root item after modification
 
         self.parent.state.set_property_count(self.count_properties())
 
 
 
-def find_child_by_text(parent_item, text):
-    for i in range(parent_item.childCount()):
-        child = parent_item.child(i)
-        if child.text(0) == text:
-            return child
-    return None
-
-def clean_text(text):
-    # replacements = [
-    #     "? ",
-    #     " ?",
-    #     "&quot;",
-    #     "Property ID: ",
-    #     "Ref: ",
-    #     "?",
-    # ]
-    #
-    # for pattern in replacements:
-    #     text = text.replace(pattern, "")
-    #
-    # text = re.sub(r" {2,}", " ", text)
-
-    replacements = [
-        r"\? ",
-        r" \?",
-        r"&quot;",
-        r"Property ID: ",
-        r"Ref: ",
-        r"\?",
-    ]
-
-    pattern = "|".join(replacements)
-
-    text = re.sub(pattern, "", text)
-
-    # remove all text after (id)
-    text = re.sub(r"(\(\d+\)).*", r"\1", text)
-
-    # remove starting " – €" and ending "+VAT"
-    text = re.sub(r" – €.*?\+VAT", "", text)
-
-    text = re.sub(r'\s+', ' ', text)
-
-    text = text.lstrip('\uFE0F \u200B')
-
-    #text = re.sub(r'^[\s\u200B-\u200D\uFEFF]+|[\s\u200B-\u200D\uFEFF]+$', '', text)
-    # text = text.replace('\uFE0F', '')
-    # text = text.lstrip('\u200B')
-    #text = re.sub(r'^\s*', '', text)
-
-    return text
-
 def compare_link_lists(links_tree_sorted, links_db_sorted):
 
-    links_tree_dict = [item['id'] for item in links_tree_sorted]
+    links_tree_dict = {}
+    for item in links_tree_sorted:
+        links_tree_dict.setdefault(item['id'], item)
 
-    print(links_tree_dict)
+    print(list(links_tree_dict))
 
     results = {
         'ids_not_found': [],
@@ -583,7 +546,7 @@ def compare_link_lists(links_tree_sorted, links_db_sorted):
         # print("Media list: " + str(db_links))
 
         if db_id in links_tree_dict:
-            tree_item = find_item_by_value(links_tree_sorted, 'id', db_id)
+            tree_item = links_tree_dict[db_id]
             tree_item_links = tree_item['links']
 
             if set(tree_item_links) == set(db_links):
@@ -595,10 +558,3 @@ def compare_link_lists(links_tree_sorted, links_db_sorted):
             results['ids_not_found'].append(db_id)
 
     return results
-
-
-def find_item_by_value(item_list, key, value):
-    for item in item_list:
-        if item.get(key) == value:
-            return item
-    return None
\ No newline at end of file
@@ -0,0 +1,380 @@
+try:
+    import numpy as np
+    from numpy.dtypes import StringDType
+except ImportError:  # NumPy 2 is optional, actions then run item by item
+    np = None
+
+from condition_expression import compile_expression
+from property_store import CONDITIONS, EXPRESSION, PropertyStore, expected_number, to_number
+
+
+def available():
+    return np is not None
+
+
+class FieldArrays:
+    """
+    NumPy copies of property fields for the given rows, created on first use.
+    A field is a store column or any other path below <property>, which is read
+    from the nodes (first match on every level, like find_path). Writes made
+    through the action pipeline are mirrored with assign(), so later conditions
+    see the new values without going back to the nodes.
+
+    base is an unchanged FieldArrays of the same rows (see cached_arrays): its
+    arrays and masks are shared, and copied before a field is written.
+    """
+
+    def __init__(self, store, rows, base=None):
+        self.store = store
+        self.rows = rows
+        self.base = base
+        self._strings = {}  # field -> StringDType array, "" where the field is missing
+        self._present = {}  # field -> bool array, True where the field exists
+        self._numbers = {}  # field -> float array, NaN where the text is not a number
+        self._texts = {}  # (child, depth) -> (texts of all field nodes, row position of each), see texts()
+        self._masks = {}  # key -> mask of a condition on the unchanged fields, see cached_mask()
+        self._row_array = None  # self.rows as a NumPy array, for rows_mask()
+        self._writes = {}  # field -> [(mask, text)] given to assign(), the store's indexes no longer hold for it
+
+    def values(self, field):
+        if field in PropertyStore.FIELDS:
+            column = self.store.column(field)
+            return [column[row] for row in self.rows]
+        nodes = [self.store.node(row).find_path(field) for row in self.rows]
+        return [node.text if node is not None else None for node in nodes]
+
+    def strings(self, field):
+        if field not in self._strings:
+            if self.base is not None:
+                self._strings[field] = self.base.strings(field)
+                self._present[field] = self.base.present(field)
+                return self._strings[field]
+            values = self.values(field)
+            self._present[field] = np.fromiter((value is not None for value in values), bool, len(values))
+            self._strings[field] = np.array([value or "" for value in values], dtype=StringDType())
+        return self._strings[field]
+
+    def present(self, field):
+        self.strings(field)
+        return self._present[field]
+
+    def numbers(self, field):
+        if field not in self._numbers:
+            if self.base is not None:
+                numbers = self.base.numbers(field)
+                if field in self._writes:
+                    # The texts are converted once in the base, the writes are replayed on a copy
+                    numbers = numbers.copy()
+                    for mask, text in self._writes[field]:
+                        numbers[mask] = to_number(text)
+                self._numbers[field] = numbers
+            else:
+                strings = self.strings(field)
+                self._numbers[field] = np.fromiter((to_number(value) for value in strings), float, len(strings))
+        return self._numbers[field]
+
+    def texts(self, child, depth):
+        """
+        Texts of the nodes a condition on child looks at (see field_nodes) for all
+        rows in one array, and the position in self.rows each of them belongs to.
+        depth None is the default depth of field_nodes.
+        """
+        if self.base is not None:
+            return self.base.texts(child, depth)
+        key = (child, depth)
+        if key not in self._texts:
+            from action_plan import CONDITION_DEPTH, DocumentEditor, field_nodes  # action_plan imports this module
+            reader = DocumentEditor(None)
+            if depth is None:
+                depth = CONDITION_DEPTH
+            texts = []
+            positions = []
+            for position, row in enumerate(self.rows):
+                for node in field_nodes(reader, self.store.node(row), child, depth):
+                    texts.append(node.text)
+                    positions.append(position)
+            self._texts[key] = np.array(texts, dtype=StringDType()), np.array(positions, dtype=np.intp)
+        return self._texts[key]
+
+    def cached_mask(self, key, compute):
+        # Masks that only depend on the fields as they were loaded are computed once per base
+        if self.base is not None:
+            return self.base.cached_mask(key, compute)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = self._masks[key] = compute()
+        return mask.copy()
+
+    def indexed(self, field, condition):
+        # The store can answer the condition from its indexes while the field is as it was loaded
+        return field not in self._writes and self.store.indexed(field, condition)
+
+    def rows_mask(self, rows):
+        # Boolean mask of the given store rows (sorted, all of them in self.rows)
+        if self.base is not None:
+            return self.base.rows_mask(rows)
+        mask = np.zeros(len(self.rows), dtype=bool)
+        if rows:
+            if self._row_array is None:
+                self._row_array = np.array(self.rows)
+            mask[np.searchsorted(self._row_array, rows)] = True
+        return mask
+
+    def assign(self, field, mask, text):
+        strings = self.strings(field)
+        if self.base is not None and field not in self._writes:
+            # Still the base's arrays
+            self._strings[field] = strings = strings.copy()
+            self._present[field] = self._present[field].copy()
+            if field in self._numbers:
+                self._numbers[field] = self._numbers[field].copy()
+        self._writes.setdefault(field, []).append((mask, text))
+        strings[mask] = text
+        self._present[field][mask] = True
+        if field in self._numbers:
+            self._numbers[field][mask] = to_number(text)
+
+
+def cached_arrays(store):
+    """FieldArrays of all live rows, kept in the store's cache until the store changes. Never written."""
+    arrays = store.cache.get("arrays")
+    if arrays is None:
+        arrays = store.cache["arrays"] = FieldArrays(store, store.rows())
+    return arrays
+
+
+def condition_mask(arrays, field, condition, expected_value):
+    """Boolean mask of the rows whose field exists and satisfies the condition."""
+    if condition == EXPRESSION:
+        # The expression names its own fields
+        return expression_mask(arrays, compile_expression(expected_value).tree)
+    if arrays.indexed(field, condition):
+        # Interned fields and ids are looked up in the store's indexes, their arrays are never built
+        return arrays.cached_mask((field, condition, expected_value),
+                                  lambda: arrays.rows_mask(arrays.store.match(field, condition, expected_value)))
+    return values_mask(arrays.strings(field), arrays.present(field), lambda: arrays.numbers(field),
+                       condition, expected_value)
+
+
+def texts_mask(arrays, child, depth, condition, expected_value):
+    # Boolean mask of the rows with a field node of child (see field_nodes) that satisfies the condition
+    def compute():
+        texts, positions = arrays.texts(child, depth)
+        numbers = lambda: np.fromiter((to_number(text) for text in texts), float, len(texts))
+        found = values_mask(texts, np.ones(len(texts), dtype=bool), numbers, condition, expected_value)
+        mask = np.zeros(len(arrays.rows), dtype=bool)
+        mask[positions[found]] = True
+        return mask
+    return arrays.cached_mask(("texts", child, depth, condition, expected_value), compute)
+
+
+def values_mask(strings, present, numbers, condition, expected_value):
+    # Mask of a simple condition on text arrays; numbers() gives the texts as floats, only numeric conditions need it
+    match condition:
+        case "":
+            return present.copy()
+        case "equal":
+            return present & (strings == expected_value)
+        case "contains":
+            return present & (np.strings.find(strings, expected_value) >= 0)
+        case "does not contain":
+            return present & (np.strings.find(strings, expected_value) < 0)
+        case "greater than":
+            return numbers() > expected_number(expected_value)
+        case "less than":
+            return numbers() < expected_number(expected_value)
+        case "greater or equal":
+            return numbers() >= expected_number(expected_value)
+        case "less or equal":
+            return numbers() <= expected_number(expected_value)
+        case _:
+            raise ValueError(f"Unsupported condition: {condition}")
+
+
+def expression_mask(arrays, tree):
+    """Boolean mask of the rows that match a condition_expression tree, same rules as Expression.matches."""
+    match tree:
+        case ("and", operands):
+            mask = expression_mask(arrays, operands[0])
+            for operand in operands[1:]:
+                mask &= expression_mask(arrays, operand)
+            return mask
+        case ("or", operands):
+            mask = expression_mask(arrays, operands[0])
+            for operand in operands[1:]:
+                mask |= expression_mask(arrays, operand)
+            return mask
+        case ("not", operand):
+            return ~expression_mask(arrays, operand)
+        case ("exists", field):
+            return arrays.present(field).copy()
+        case ("compare", field, operator, value):
+            present = arrays.present(field)
+            if isinstance(value, float) and operator in ("==", "!=", "<", "<=", ">", ">="):
+                values = arrays.numbers(field)
+            else:
+                values = arrays.strings(field)
+            match operator:
+                case "==":
+                    return present & (values == value)
+                case "!=":
+                    return present & (values != value)
+                case "<":
+                    return present & (values < value)
+                case "<=":
+                    return present & (values <= value)
+                case ">":
+                    return present & (values > value)
+                case ">=":
+                    return present & (values >= value)
+                case "contains":
+                    return present & (np.strings.find(values, value) >= 0)
+                case "~":
+                    # Distinct texts are searched once, interned fields have only a few
+                    found = {text: value.search(text) is not None for text in set(values.tolist())}
+                    return present & np.fromiter((found[text] for text in values.tolist()), bool, len(values))
+                case "in" | "not in":
+                    strings, numbers = value
+                    mask = np.isin(values, list(strings)) if strings else np.zeros(len(values), dtype=bool)
+                    if numbers:
+                        mask |= np.isin(arrays.numbers(field), list(numbers))
+                    return present & (mask if operator == "in" else ~mask)
+
+
+def can_vectorize(actions):
+    # Only actions on known property fields map to store columns
+    if not available():
+        return False
+    for action in actions:
+        if action["parent"] != "property":
+            return False
+        condition = action["condition"]
+        if condition == EXPRESSION:
+            # Every path of the expression has to be a column, and so has the changed field
+            if not compile_expression(action["value"]).fields <= set(PropertyStore.FIELDS):
+                return False
+            if action["action"] == "modify_node_type" and action["child"] not in PropertyStore.FIELDS:
+                return False
+            continue
+        if action["action"] == "add_node_type":
+            continue
+        if action["child"] not in PropertyStore.FIELDS or condition not in CONDITIONS:
+            return False
+    return True
+
+
+def action_mask(arrays, action, alive):
+    # Rows the action changes or removes; add_node_type adds to every property unless it has an expression
+    if action["action"] == "add_node_type" and action["condition"] != EXPRESSION:
+        return alive.copy()
+    if (action["action"] == "remove_node_by_condition" and action["condition"] != EXPRESSION
+            and action["child"] not in PropertyStore.FIELDS):
+        # Other children are searched like field_nodes() does, any node found can match
+        return texts_mask(arrays, action["child"], action.get("depth"), action["condition"], action["value"]) & alive
+    mask = condition_mask(arrays, action["child"], action["condition"], action["value"]) & alive
+    if action["action"] == "modify_node_type" and action["condition"] == EXPRESSION:
+        # The expression looks at the whole property, the field to change has to exist too
+        mask &= arrays.present(action["child"])
+    return mask
+
+
+def added_text(action):
+    # An expression is in the value, the new node then gets the new value
+    return action["new_value"] if action["condition"] == EXPRESSION else action["value"]
+
+
+def run_vectorized(editor, actions, progress_callback):
+    """
+    Run add/remove/modify actions on all properties with one boolean mask per
+    condition. Removals only clear bits in the "alive" mask and are applied
+    together at the end; modifications and additions are written to the nodes
+    and mirrored in the arrays for the next actions.
+    """
+    store = editor.document.store
+    base = cached_arrays(store)
+    rows = base.rows
+    nodes = [store.node(row) for row in rows]
+    arrays = FieldArrays(store, rows, base)
+    alive = np.ones(len(rows), dtype=bool)
+
+    for index, action in enumerate(actions):
+        name = action["action"]
+        child = action["child"]
+        mask = action_mask(arrays, action, alive)
+
+        if name == "add_node_type":
+            text = added_text(action)
+            for i in np.flatnonzero(mask):
+                editor.append_node(nodes[i], child, text)
+            if child in PropertyStore.FIELDS and "/" not in child:
+                # The new node is the field's value only where the field was missing
+                arrays.assign(child, mask & ~arrays.present(child), text)
+        else:
+            if name == "remove_node_by_condition":
+                alive &= ~mask
+            else:
+                new_value = action["new_value"]
+                for i in np.flatnonzero(mask):
+                    editor.set_node_text(editor.find_path(nodes[i], child), new_value)
+                arrays.assign(child, mask, new_value)
+
+        progress_callback(int((index + 1) / len(actions) * 100))
+
+    editor.remove_nodes([nodes[i] for i in np.flatnonzero(~alive)])
+    progress_callback(100)
+
+
+def preview_vectorized(store, actions):
+    """
+    Same evaluation as run_vectorized without writing anything: the number of
+    properties every action would add to, modify or remove, and the number of
+    properties left at the end. Any field can be used; what is read from the
+    nodes stays in the store's cache with the column arrays until the document
+    changes, so the preview is cheap to refresh. Raises ValueError for lists
+    whose counts can't be worked out this way.
+    """
+    read = preview_fields(actions)
+    base = cached_arrays(store)
+    arrays = FieldArrays(store, base.rows, base)
+    alive = np.ones(len(base.rows), dtype=bool)
+    hits = []
+
+    for action in actions:
+        child = action["child"]
+        mask = action_mask(arrays, action, alive)
+        hits.append(int(np.count_nonzero(mask)))
+
+        if action["action"] == "add_node_type":
+            if child in read and "/" not in child:
+                arrays.assign(child, mask & ~arrays.present(child), added_text(action))
+        elif action["action"] == "remove_node_by_condition":
+            alive &= ~mask
+        elif child in read:
+            arrays.assign(child, mask, action["new_value"])
+
+    return hits, int(np.count_nonzero(alive))
+
+
+def preview_fields(actions):
+    # Fields that the actions read through FieldArrays; a later action may only
+    # search nodes with field_nodes() when no earlier action changes them
+    read = set()
+    changed_tags = set()
+    for action in actions:
+        if action["parent"] != "property":
+            raise ValueError("only actions on <property> can be counted ahead")
+        name = action["action"]
+        child = action["child"]
+        if action["condition"] == EXPRESSION:
+            read |= compile_expression(action["value"]).fields
+            if name == "modify_node_type":
+                read.add(child)
+        elif name == "remove_node_by_condition" and child not in PropertyStore.FIELDS:
+            tag = child.split("/")[-1]
+            if tag in changed_tags:
+                raise ValueError(f"<{child}> is changed by an earlier action, its count can't be worked out ahead")
+        elif name != "add_node_type":
+            read.add(child)
+        if name != "remove_node_by_condition":
+            changed_tags.add(child.split("/")[-1])
+    return read
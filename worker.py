@@ -2,15 +2,24 @@ from PySide6.QtCore import QThread, Signal, Slot, QObject
 import time
 import random
 
+from action_plan import ActionPlan
+from progress import ProgressTracker
+
 
 class Worker(QObject):
     progress_updated = Signal(int)
+    progress_message = Signal(str)  # Stage, items/s and ETA, sent with progress_updated
+    plan_ready = Signal(str)
+    changes_ready = Signal(object)
+    action_ready = Signal(object, object)  # Action and progress callback, for actions that need the GUI thread
     finished = Signal(str)
 
     def __init__(self, tree, actions):
         super().__init__()
         self.tree = tree
         self.actions = actions
+        # Consecutive group actions are fused into one pass over the document
+        self.plan = ActionPlan(actions) if actions is not None else None
 
     @Slot()
     def run(self):
@@ -18,28 +27,29 @@ class Worker(QObject):
         try:
             if self.actions is not None:
                 task_type = "action"
-                for index, action in enumerate(self.actions):
-                    method_name = action["action"]
-                    method = getattr(self.tree, method_name)
-                    # is_last_action = (index == len(self.actions) - 1)
-
-                    # Call the method with the appropriate arguments
-                    method(self.update_progress, action)
-
-                    # if is_last_action:
-                    #    self.finished.emit()  # Signal that all actions are done
+                self.plan_ready.emit(self.plan.summary())
+                progress = ProgressTracker(self.report_progress, self.plan.passes())
+                # The worker only reads the document, changes and other actions
+                # are handed to the GUI thread
+                self.plan.run_planned(self.tree.document, progress, self.hand_over_changes, self.action_ready.emit)
             else:
                 # method = getattr(self.parent().tab_scraping, 'begin_scraping')
                 # method(self.test_method)
                 task_type = "scraping"
-                self.tree.parent.tab_scraping.begin_scraping(self.update_progress)
+                self.tree.parent.tab_scraping.begin_scraping(ProgressTracker(self.report_progress))
         except Exception as e:
             print(f"Exception in worker.run method: {e}")
         finally:
             self.finished.emit(task_type)
 
-    def update_progress(self, value):
-        self.progress_updated.emit(value)
+    def hand_over_changes(self, changes):
+        self.progress_message.emit(changes.summary())
+        self.changes_ready.emit(changes)
+
+    def report_progress(self, percent, message):
+        # Called by ProgressTracker a few times per second, not per item
+        self.progress_updated.emit(percent)
+        self.progress_message.emit(message)
 
     def test_method(self):
         print('test_method was called')
@@ -0,0 +1,320 @@
+import sys
+
+from property_store import PropertyStore
+
+
+class XmlNode:
+    """
+    Lightweight node of the in-memory feed document. Attributes of the source
+    XML are stored as child nodes named "<tag><attribute>", the same way the tree
+    view shows them.
+    """
+    __slots__ = ('tag', 'text', 'parent', 'children', '_row', '_tags')
+
+    # Nodes with fewer children are searched directly, an index would not pay off
+    TAG_INDEX_MIN_CHILDREN = 8
+
+    def __init__(self, tag, text="", parent=None):
+        self.tag = tag
+        self.text = text
+        self.parent = parent
+        self.children = []
+        self._row = 0
+        self._tags = None  # tag -> first child with that tag, built on first lookup
+
+    def child(self, index):
+        if 0 <= index < len(self.children):
+            return self.children[index]
+        return None
+
+    def child_count(self):
+        return len(self.children)
+
+    def find_child(self, tag):
+        children = self.children
+        if len(children) < self.TAG_INDEX_MIN_CHILDREN:
+            for child in children:
+                if child.tag == tag:
+                    return child
+            return None
+
+        tags = self._tags
+        if tags is None:
+            tags = {}
+            for child in reversed(children):
+                tags[child.tag] = child
+            self._tags = tags
+        return tags.get(tag)
+
+    def find_path(self, path):
+        """Follow a path of tags such as "desc/en" or "images/image/url" (first match on every level)."""
+        node = self
+        for tag in path.split("/"):
+            node = node.find_child(tag)
+            if node is None:
+                return None
+        return node
+
+    def row(self):
+        if self.parent is None:
+            return 0
+        siblings = self.parent.children
+        row = self._row
+        if row < len(siblings) and siblings[row] is self:
+            return row
+        # Siblings were inserted or removed, renumber all of them at once
+        for index, sibling in enumerate(siblings):
+            sibling._row = index
+        return self._row
+
+    def append(self, node):
+        node.parent = self
+        node._row = len(self.children)
+        self.children.append(node)
+        if self._tags is not None:
+            self._tags.setdefault(node.tag, node)
+        return node
+
+    def insert(self, index, node):
+        node.parent = self
+        self.children.insert(index, node)
+        self._tags = None
+        return node
+
+    def remove(self, node):
+        del self.children[node.row()]
+        node.parent = None
+        self._tags = None
+
+    def clear_children(self):
+        self.children = []
+        self._tags = None
+
+    def depth(self):
+        level = 1
+        node = self.parent
+        while node is not None:
+            level += 1
+            node = node.parent
+        return level
+
+
+def node_from_element(element, parent=None):
+    """Convert an lxml element and its subtree to XmlNode objects."""
+    tag = sys.intern(element.tag)
+    node = XmlNode(tag, element.text.strip() if element.text else "")
+    if parent is not None:
+        parent.append(node)
+
+    # Add attributes as child nodes
+    for attr_name, attr_value in element.attrib.items():
+        node.append(XmlNode(sys.intern(f"{tag}{attr_name}"), attr_value))
+
+    for child in element:
+        if isinstance(child.tag, str):  # Skip comments and processing instructions
+            node_from_element(child, node)
+
+    return node
+
+
+class XmlDocument:
+    """
+    In-memory feed document: the root node, the column store of its properties
+    and helpers to walk and change them. Changes made after loading should go
+    through insert_node/remove_node(s)/restore_nodes/set_text, so the store
+    stays in sync with the nodes, and so they are recorded in the journal
+    (an EditJournal) when the document has one.
+    """
+
+    def __init__(self, journal=None):
+        self.root = None
+        self.store = PropertyStore()
+        self.journal = journal
+        # Counts the changes, so a reader on another thread can tell whether the document changed meanwhile
+        self.changes = 0
+
+    def clear(self):
+        self.changes += 1
+        self.root = None
+        self.store.clear()
+        self._clear_journal()
+
+    def is_empty(self):
+        return self.root is None
+
+    def set_root(self, tag, attrib=None, text=""):
+        self.changes += 1
+        self.store.clear()
+        self._clear_journal()
+        self.root = XmlNode(sys.intern(tag), text)
+        for attr_name, attr_value in (attrib or {}).items():
+            self.root.append(XmlNode(sys.intern(f"{tag}{attr_name}"), attr_value))
+        return self.root
+
+    def set_root_node(self, root):
+        # Use an already built tree (e.g. loaded from a snapshot) as the document
+        self.changes += 1
+        self.root = root
+        self.reindex()
+        self._clear_journal()
+        return self.root
+
+    def properties(self, tag="property"):
+        if self.root is None:
+            return
+        for node in self.root.children:
+            if node.tag == tag:
+                yield node
+
+    def count_properties(self):
+        return sum(1 for _ in self.properties())
+
+    def reindex(self):
+        # Rebuild the property columns, called after the document was loaded
+        self.store.rebuild(self.properties())
+
+    # MUTATIONS
+
+    def insert_node(self, parent, node, row=None):
+        self.changes += 1
+        if row is None:
+            parent.append(node)
+        else:
+            parent.insert(row, node)
+        if self.journal is not None:
+            self.journal.record_insert(parent, node.row(), node)
+        self._node_changed(node, added=True)
+        if parent is self.root and node.tag == "property" and node.row() < len(parent.children) - 1:
+            # Inserted before other properties, its row was appended to the store
+            self.store.reorder(self.properties())
+        return node
+
+    def remove_node(self, node):
+        self.changes += 1
+        parent = node.parent
+        if node is self.root:
+            self.clear()
+            return
+        if parent is None:
+            return  # Already detached
+        if self.journal is not None:
+            self.journal.record_remove([(parent, node.row(), node)])
+        property_node, child = self._property_of(node)
+        parent.remove(node)
+        if property_node is node:
+            self.store.discard(node)
+        elif property_node is not None:
+            self.store.refresh_child(property_node, child.tag)
+
+    def remove_nodes(self, nodes):
+        """
+        Remove many nodes at once. The children of every affected parent are
+        rebuilt from the survivors in one go instead of being shifted once per
+        removed node.
+        """
+        self.changes += 1
+        removed_by_parent = {}
+        for node in nodes:
+            if node is self.root:
+                self.clear()
+                return
+            if node.parent is not None:
+                removed_by_parent.setdefault(node.parent, set()).add(node)
+
+        if self.journal is not None:
+            self.journal.record_remove([(parent, node.row(), node)
+                                        for parent, removed in removed_by_parent.items() for node in removed])
+
+        for parent, removed in removed_by_parent.items():
+            property_node, child = self._property_of(parent)
+            survivors = [node for node in parent.children if node not in removed]
+            parent.clear_children()
+            for node in survivors:
+                parent.append(node)
+            for node in removed:
+                node.parent = None
+
+            if parent is self.root:
+                self.store.discard_many(removed)
+            elif property_node is parent:
+                for tag in {node.tag for node in removed}:
+                    self.store.refresh_child(property_node, tag)
+            elif property_node is not None:
+                self.store.refresh_child(property_node, child.tag)
+
+    def restore_nodes(self, entries):
+        """
+        Put removed nodes back, entries are (parent, row, node) with the rows the
+        nodes had before they were removed. Every parent gets its children merged
+        with the restored ones in one go.
+        """
+        self.changes += 1
+        restored_by_parent = {}
+        for parent, row, node in entries:
+            restored_by_parent.setdefault(parent, []).append((row, node))
+
+        if self.journal is not None:
+            self.journal.record_restore(entries)
+
+        for parent, restored in restored_by_parent.items():
+            restored.sort(key=lambda entry: entry[0])
+            survivors = iter(parent.children)
+            children = []
+            for row, node in restored:
+                # Fill the rows before this one with the nodes that stayed
+                children.extend(next(survivors) for _ in range(row - len(children)))
+                children.append(node)
+            children.extend(survivors)
+            parent.clear_children()
+            for node in children:
+                parent.append(node)
+
+            property_node, child = self._property_of(parent)
+            if parent is self.root:
+                restored_properties = [node for _, node in restored if node.tag == "property"]
+                for node in restored_properties:
+                    self.store.add(node)
+                if restored_properties:
+                    # The rows were appended, the store follows the document order
+                    self.store.reorder(self.properties())
+            elif property_node is parent:
+                for tag in {node.tag for _, node in restored}:
+                    self.store.refresh_child(property_node, tag)
+            elif property_node is not None:
+                self.store.refresh_child(property_node, child.tag)
+
+    def set_text(self, node, text):
+        self.changes += 1
+        if self.journal is not None:
+            self.journal.record_text(node, node.text, text)
+        node.text = text
+        self._node_changed(node)
+
+    def _clear_journal(self):
+        # A new or closed document can't be undone into the old one
+        if self.journal is not None:
+            self.journal.clear()
+
+    def _property_of(self, node):
+        # The <property> node the given node belongs to and its direct child that
+        # contains the node: (property, child), (property, None) or (None, None)
+        if self.root is None:
+            return None, None
+        child = None
+        while node.parent is not None and node.parent is not self.root:
+            child = node
+            node = node.parent
+        if node.parent is self.root and node.tag == "property":
+            return node, child
+        return None, None
+
+    def _node_changed(self, node, added=False):
+        property_node, child = self._property_of(node)
+        if property_node is None:
+            return
+        if child is None:
+            if added:
+                self.store.add(node)
+            return  # The property's own text is not stored
+        # Only the column(s) fed by this child are updated
+        self.store.refresh_child(property_node, child.tag)
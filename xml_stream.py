@@ -0,0 +1,79 @@
+import os
+
+from lxml import etree
+
+
+class FeedReader:
+    """
+    Reads an XML feed with lxml iterparse and hands out the top-level elements
+    (usually <property>) in batches, so the whole document is never held in memory
+    twice. Every element of a batch is cleared as soon as the consumer asks for
+    the next batch.
+
+    keep(element) can be given to drop top-level elements while parsing, they are
+    never handed out.
+    """
+
+    def __init__(self, xml_file, batch_size=500, keep=None):
+        self.xml_file = xml_file
+        self.batch_size = batch_size
+        self.keep = keep
+        self.skipped = 0  # Top-level elements dropped by keep()
+        self.root_tag = None
+        self.root_attrib = {}
+        self.root_text = ""
+        self.progress = 0  # Percentage of the file that has been read
+
+    def batches(self):
+        file_size = os.path.getsize(self.xml_file) or 1
+
+        with open(self.xml_file, 'rb') as xml_file:
+            context = etree.iterparse(xml_file, events=("start", "end"))
+            root = None
+            depth = 0
+            batch = []
+
+            for event, element in context:
+                if event == "start":
+                    if root is None:
+                        root = element
+                        self.root_tag = element.tag
+                        self.root_attrib = dict(element.attrib)
+                    depth += 1
+                    continue
+
+                depth -= 1
+                if depth != 1:
+                    continue
+
+                # A complete top-level subtree is available
+                if self.keep is not None and not self.keep(element):
+                    self.skipped += 1
+                    element.clear(keep_tail=False)
+                    root.remove(element)
+                    continue
+
+                batch.append(element)
+                if len(batch) >= self.batch_size:
+                    self.progress = int(xml_file.tell() / file_size * 100)
+                    yield batch
+                    self.release(root, batch)
+                    batch = []
+
+            if root is not None:
+                self.root_text = root.text.strip() if root.text else ""
+
+            self.progress = 100
+            if batch:
+                yield batch
+                self.release(root, batch)
+
+    @staticmethod
+    def release(root, batch):
+        # Free processed subtrees and drop them from the root
+        for element in batch:
+            element.clear(keep_tail=False)
+        while len(root) and root[0] is not batch[-1]:
+            del root[0]
+        if len(root):
+            del root[0]
@@ -0,0 +1,222 @@
+from PySide6.QtCore import QAbstractItemModel, QModelIndex, Qt
+
+
+class XmlTreeModel(QAbstractItemModel):
+    """
+    Item model that reads the XmlDocument directly. Children are exposed to the
+    view lazily in batches (canFetchMore/fetchMore), so only the rows the user
+    actually opens are ever created on the Qt side.
+
+    All document changes made while a view is attached must go through the
+    mutation methods below, so the view is notified about them.
+    """
+    FETCH_BATCH = 256
+    ROW_UPDATE_LIMIT = 32  # remove_nodes()/restore_nodes() reset the model above this count
+    HEADERS = ("Tag", "Value")
+
+    def __init__(self, document, parent=None):
+        super().__init__(parent)
+        self.document = document
+        self._fetched = {}    # node -> number of children exposed to the view
+        self._bulk_depth = 0  # > 0 while a bulk update is running
+
+    # READ API
+
+    def node_from_index(self, index):
+        if index.isValid():
+            return index.internalPointer()
+        return None
+
+    def index_from_node(self, node, column=0):
+        if node is None or not self._is_exposed(node):
+            return QModelIndex()
+        return self.createIndex(node.row(), column, node)
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column, self.document.root)
+        parent_node = parent.internalPointer()
+        return self.createIndex(row, column, parent_node.children[row])
+
+    def parent(self, index=QModelIndex()):
+        if not index.isValid():
+            return QModelIndex()
+        parent_node = index.internalPointer().parent
+        if parent_node is None:
+            return QModelIndex()
+        return self.createIndex(parent_node.row(), 0, parent_node)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        if not parent.isValid():
+            return 0 if self.document.root is None else 1
+        return self._fetched.get(parent.internalPointer(), 0)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+
+    def hasChildren(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return self.document.root is not None
+        if parent.column() > 0:
+            return False
+        return bool(parent.internalPointer().children)
+
+    def canFetchMore(self, parent):
+        if not parent.isValid() or self._bulk_depth:
+            return False
+        node = parent.internalPointer()
+        return self._fetched.get(node, 0) < len(node.children)
+
+    def fetchMore(self, parent):
+        if not parent.isValid():
+            return
+        node = parent.internalPointer()
+        fetched = self._fetched.get(node, 0)
+        count = min(self.FETCH_BATCH, len(node.children) - fetched)
+        if count <= 0:
+            return
+        self.beginInsertRows(parent, fetched, fetched + count - 1)
+        self._fetched[node] = fetched + count
+        self.endInsertRows()
+
+    def fetch_all(self, index):
+        while self.canFetchMore(index):
+            self.fetchMore(index)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        node = index.internalPointer()
+        return node.tag if index.column() == 0 else node.text
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or index.column() != 1 or role != Qt.EditRole:
+            return False
+        self.document.set_text(index.internalPointer(), value)
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.column() == 1:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    # MUTATION API
+
+    def reset(self):
+        self.beginResetModel()
+        self._fetched.clear()
+        self.endResetModel()
+
+    def begin_bulk_update(self):
+        # The document may be changed freely (also from a worker thread) until
+        # end_bulk_update() is called; views are reset once at the end.
+        if self._bulk_depth == 0:
+            self.beginResetModel()
+        self._bulk_depth += 1
+
+    def end_bulk_update(self):
+        if self._bulk_depth == 0:
+            return
+        self._bulk_depth -= 1
+        if self._bulk_depth == 0:
+            self._fetched.clear()
+            self.endResetModel()
+
+    def is_bulk_update(self):
+        return self._bulk_depth > 0
+
+    def insert_node(self, parent_node, node, row=None):
+        if row is None:
+            row = len(parent_node.children)
+        fetched = self._fetched.get(parent_node, 0)
+
+        if not self._bulk_depth and row <= fetched and self._is_exposed(parent_node):
+            parent_index = self.createIndex(parent_node.row(), 0, parent_node)
+            self.beginInsertRows(parent_index, row, row)
+            self.document.insert_node(parent_node, node, row)
+            self._fetched[parent_node] = fetched + 1
+            self.endInsertRows()
+        else:
+            self.document.insert_node(parent_node, node, row)
+            if row < fetched:
+                self._fetched[parent_node] = fetched + 1
+        return node
+
+    def remove_node(self, node):
+        parent_node = node.parent
+        if node is self.document.root:
+            # Removing the root node clears the document
+            self.beginResetModel()
+            self.document.clear()
+            self._fetched.clear()
+            self.endResetModel()
+            return
+        if parent_node is None:
+            return
+
+        row = node.row()
+        fetched = self._fetched.get(parent_node, 0)
+        self._fetched.pop(node, None)
+
+        if not self._bulk_depth and row < fetched and self._is_exposed(parent_node):
+            parent_index = self.createIndex(parent_node.row(), 0, parent_node)
+            self.beginRemoveRows(parent_index, row, row)
+            self.document.remove_node(node)
+            self._fetched[parent_node] = fetched - 1
+            self.endRemoveRows()
+        else:
+            self.document.remove_node(node)
+            if row < fetched:
+                self._fetched[parent_node] = fetched - 1
+
+    def remove_nodes(self, nodes):
+        # Few nodes are removed row by row, more in one document change and one reset
+        if len(nodes) <= self.ROW_UPDATE_LIMIT and not self._bulk_depth:
+            for node in nodes:
+                self.remove_node(node)
+            return
+        self.begin_bulk_update()
+        try:
+            self.document.remove_nodes(nodes)
+        finally:
+            self.end_bulk_update()
+
+    def restore_nodes(self, entries):
+        # entries are (parent, row, node) of removed nodes, put back like remove_nodes() takes them out
+        if len(entries) <= self.ROW_UPDATE_LIMIT and not self._bulk_depth:
+            for parent_node, row, node in sorted(entries, key=lambda entry: entry[1]):
+                self.insert_node(parent_node, node, row)
+            return
+        self.begin_bulk_update()
+        try:
+            self.document.restore_nodes(entries)
+        finally:
+            self.end_bulk_update()
+
+    def set_node_text(self, node, text):
+        self.document.set_text(node, text)
+        if not self._bulk_depth and self._is_exposed(node):
+            index = self.createIndex(node.row(), 1, node)
+            self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+
+    def _is_exposed(self, node):
+        # True if the node has a row in the view (all its ancestors were fetched)
+        while node is not self.document.root:
+            parent_node = node.parent
+            if parent_node is None or node.row() >= self._fetched.get(parent_node, 0):
+                return False
+            node = parent_node
+        return node is not None
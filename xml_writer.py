@@ -0,0 +1,34 @@
+from lxml import etree
+
+# Size of the buffer in front of the output file
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def element_from_node(node):
+    """Build an lxml element for a node and its subtree (without recursion)."""
+    element = etree.Element(node.tag)
+    element.text = node.text
+    stack = [(node, element)]
+    while stack:
+        parent_node, parent_element = stack.pop()
+        for child in parent_node.children:
+            child_element = etree.SubElement(parent_element, child.tag)
+            child_element.text = child.text
+            if child.children:
+                stack.append((child, child_element))
+    return element
+
+
+def write_xml(root, file_name):
+    """
+    Write the document incrementally: only the root tag is kept open and every
+    child of the root (one property) is turned into an element, written and
+    dropped, so memory use does not grow with the number of properties.
+    """
+    with open(file_name, 'wb', buffering=WRITE_BUFFER_SIZE) as file:
+        with etree.xmlfile(file, encoding="ASCII") as xf:
+            with xf.element(root.tag):
+                if root.text:
+                    xf.write(root.text)
+                for child in root.children:
+                    xf.write(element_from_node(child))